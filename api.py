@@ -0,0 +1,141 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+
+from models import db, Venue, Artist, VenueGenre, ArtistGenre, Job
+from queries import get_genre_args, filter_genres, genre_list, shows_between, split_genres
+
+#----------------------------------------------------------------------------#
+# Read API.
+#----------------------------------------------------------------------------#
+# Streams catalog rows as NDJSON (default) or, with ?format=json, as a JSON
+# array. Rows come from a server-side cursor in batches of STREAM_BATCH_SIZE,
+# so memory use stays flat however large the result is. /api/typeahead
+# completes venue and artist names from memory (see typeahead.py), and
+# /api/jobs/<id> reports on a background job (see jobs.py).
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+STREAM_BATCH_SIZE = 1000
+
+VENUE_COLUMNS = (Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                 Venue.phone, Venue.website, Venue.image_link,
+                 Venue.facebook_link, Venue.seeking_talent, Venue.seeking_description,
+                 Venue.upcoming_shows_count, Venue.past_shows_count)
+
+ARTIST_COLUMNS = (Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+                  Artist.website, Artist.image_link,
+                  Artist.facebook_link, Artist.seeking_venue, Artist.seeking_description,
+                  Artist.upcoming_shows_count, Artist.past_shows_count)
+
+SHOW_COLUMNS = ('id', 'artist_id', 'venue_id', 'start_time')
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def _datetime_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+def _split_genres(row):
+    row['genres'] = split_genres(row['genres'])
+    return row
+
+
+def _filter_area(query, model):
+    if request.args.get('city'):
+        query = query.filter(db.func.lower(model.city) == request.args['city'].lower())
+    if request.args.get('state'):
+        query = query.filter(db.func.lower(model.state) == request.args['state'].lower())
+    return query
+
+
+def stream_rows(query, transform=None):
+    rows = query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+    encoder = json.JSONEncoder(default=_json_default)
+
+    def encode(row):
+        row = row._asdict()
+        return encoder.encode(transform(row) if transform else row)
+
+    if request.args.get('format') == 'json':
+        def generate():
+            separator = '['
+            for row in rows:
+                yield separator + encode(row)
+                separator = ','
+            yield '[]' if separator == '[' else ']'
+        mimetype = 'application/json'
+    else:
+        def generate():
+            for row in rows:
+                yield encode(row) + '\n'
+        mimetype = 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+@api.route('/venues')
+@db.read_only
+def venues():
+    query = db.session.query(*VENUE_COLUMNS, genre_list(Venue, VenueGenre.venue_id, VenueGenre.genre))
+    query = filter_genres(_filter_area(query, Venue), Venue, get_genre_args())
+    return stream_rows(query.order_by(Venue.id), _split_genres)
+
+
+@api.route('/artists')
+@db.read_only
+def artists():
+    query = db.session.query(*ARTIST_COLUMNS, genre_list(Artist, ArtistGenre.artist_id, ArtistGenre.genre))
+    query = filter_genres(_filter_area(query, Artist), Artist, get_genre_args())
+    return stream_rows(query.order_by(Artist.id), _split_genres)
+
+
+@api.route('/shows')
+@db.read_only
+def shows():
+    # ?from= / ?to= bound start_time (ISO 8601); ?city= / ?state= match the venue.
+    # Archived shows are included.
+    shows = shows_between(_datetime_arg('from'), _datetime_arg('to')).subquery('shows')
+    query = db.session.query(*[shows.c[column] for column in SHOW_COLUMNS],
+                             Artist.name.label('artist_name'), Venue.name.label('venue_name'),
+                             Venue.city, Venue.state) \
+        .join(Artist, shows.c.artist_id == Artist.id) \
+        .join(Venue, shows.c.venue_id == Venue.id)
+    return stream_rows(_filter_area(query, Venue).order_by(shows.c.start_time, shows.c.id))
+
+
+@api.route('/typeahead')
+@db.read_only
+def typeahead():
+    # Name completions for the show form, from the in-memory prefix
+    # indexes (see typeahead.py): [{"id": ..., "name": ...}].
+    kind = request.args.get('kind')
+    if kind not in ('venue', 'artist'):
+        abort(400)
+    results = current_app.extensions['typeahead'].complete(kind, request.args.get('q', ''))
+    return jsonify([{'id': id, 'name': name} for id, name in results])
+
+
+@api.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    # Not read_only: a replica may not have seen the job finish yet.
+    job = db.session.get(Job, job_id)
+    if job is None:
+        abort(404)
+    return jsonify({
+        'id': job.id, 'name': job.name, 'state': job.state, 'attempts': job.attempts,
+        'run_at': job.run_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': job.result, 'error': job.error,
+    })
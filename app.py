@@ -2,66 +2,88 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-from audioop import add
-from dataclasses import dataclass
-from email.policy import default
+import functools
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, flash, redirect, url_for, abort
-from flask_moment import Moment
+from datetime import datetime, timedelta
+from flask import Blueprint, Flask, Markup, current_app, render_template, request, flash, redirect, url_for, abort, jsonify
+from jinja2 import FileSystemBytecodeCache
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
 from forms import *
-from flask_migrate import Migrate
-from datetime import datetime
-import sys
-#----------------------------------------------------------------------------#
-# App Config.
-#----------------------------------------------------------------------------#
-
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-from models import db, Venue, Artist, Show
-db.init_app(app)
-migrate = Migrate(app, db)
+import os
+import click
+
+from models import db, Venue, Artist, Show, ShowArchive, VenueGenre, GENRE_VALUES
+from queries import get_venue_areas, get_genre_args, filter_genres, load_detail, shows_between, shows_of
+from loaders import get_loader
+from pagination import paginate
+from search import Search
+from cache import PageCache
+from instrumentation import QueryStats
+from metrics import Metrics
+from recent import RecentlyAdded
+from typeahead import Typeahead
+from assets import Assets
+from compression import Compression
+from jobs import JobQueue
+from api import api
+from importer import CatalogImporter, DEFAULT_BATCH_SIZE
+from counters import record_show_created, record_venue_shows_deleted, rollover_shows, recompute_show_counters
+from archive import archive_shows, DEFAULT_BATCH_SIZE as ARCHIVE_BATCH_SIZE
+
+search = Search()
+page_cache = PageCache()
+query_stats = QueryStats()
+metrics = Metrics()
+recent = RecentlyAdded()
+typeahead = Typeahead()
+assets = Assets()
+compression = Compression()
+jobs = JobQueue()
+
+views = Blueprint('main', __name__, cli_group=None)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
-app.jinja_env.filters['datetime'] = format_datetime
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@functools.lru_cache(maxsize=64)
+def get_datetime_pattern(format, locale):
+  # babel parses the pattern and locale data on every call; do it once.
+  # Imported here: loading babel's locale data slows down every worker start
+  import babel
+  import babel.dates
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+def format_datetime_uncached(value, format, locale):
+  pattern, locale = get_datetime_pattern(format, locale)
+  return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  # takes datetimes, or strings as older templates and callers passed them
+  if isinstance(value, str):
+    import dateutil.parser
+    value = dateutil.parser.parse(value)
+  # memoized per app, DATETIME_FORMAT_CACHE_SIZE entries (see create_app)
+  return current_app.extensions['datetime_format_cache'](value, format, locale)
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@views.route('/')
+@db.read_only
+@query_stats.budget(2)
 def index():
-  latest_venues = db.session.query(Venue.name).order_by(Venue.id.desc()).limit(10).all()
-  latest_artist = db.session.query(Artist.name).order_by(Artist.id.desc()).limit(10).all()
-  latest_venues_names = []
-  latest_artist_names = []
-  for venue in latest_venues:
-    latest_venues_names.append(venue[0])
-  for artist in latest_artist:
-    latest_artist_names.append(artist[0])
-  
+  # served from the per-process recently-added buffers (recent.py)
   data = {
-    'latest_artist': latest_artist_names,
-    'latest_venues': latest_venues_names
+    'latest_artist': recent.latest('artist'),
+    'latest_venues': recent.latest('venue')
   }
   return render_template('pages/home.html', data=data)
 
@@ -69,43 +91,28 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@views.route('/venues')
+@db.read_only
+@query_stats.budget(1)
+@compression.level(br=5)
 def venues():
-  data = []
-  unique_cities_and_state = set(db.session.query(Venue.city, Venue.state).all())
-  for value in unique_cities_and_state:
-    obj = {}
-    city = value[0]
-    state = value[1]
-    venues_in_citystate = Venue.query.filter(Venue.city == city and Venue.state == state).all()
-    
-    venues = []
-    for venue in venues_in_citystate:
-      venue_object = {
-        'id': venue.id,
-        'name': venue.name,
-        'num_upcoming_shows': len(get_venue_upcoming_shows(venue))
-      }
-      venues.append(venue_object)
-    obj['city'] = city
-    obj['state'] = state
-    obj['venues'] = venues
-    
-    data.append(obj)
-  return render_template('pages/venues.html', areas=data);
+  areas, page = get_venue_areas(get_genre_args())
+  return render_template('pages/venues.html', areas=areas, page=page)
 
-@app.route('/venues/search', methods=['POST'])
+@views.route('/venues/search', methods=['POST'])
+@db.read_only
+@query_stats.budget(2)
 def search_venues():
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
   search_term = request.form['search_term'].lower().strip()
-  venues_in_search = db.session.query(Venue).filter(db.func.lower(Venue.name).like('%' + search_term + '%') | db.func.lower(Venue.city).like('%' + search_term + '%') | db.func.lower(Venue.state).like('%' + search_term + '%')).all()
+  venues_in_search = [venue for venue in get_loader('venue').load_many(search.search('venue', search_term, genres=get_genre_args())) if venue is not None]
   data = []
   for venue in venues_in_search:
     obj = {
       'id': venue.id,
       'name': venue.name,
-      'num_upcoming_shows': len(get_venue_upcoming_shows(venue))
+      'num_upcoming_shows': venue.upcoming_shows_count
     }
     data.append(obj)
   
@@ -116,43 +123,34 @@ def search_venues():
   
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
-@app.route('/venues/<int:venue_id>')
+@views.route('/venues/<int:venue_id>')
+@db.read_only
+@query_stats.budget(1)
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  venue = Venue.query.get(venue_id)
-  all_past_shows = get_venue_past_shows(venue)
-  all_upcoming_shows = get_venue_upcoming_shows(venue)
-  
-  data = {
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres.split(","),
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description": venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": get_artist_data_in_shows(all_past_shows),
-    "upcoming_shows": get_artist_data_in_shows(all_upcoming_shows),
-    "past_shows_count": len(get_venue_past_shows(venue)),
-    "upcoming_shows_count": len(get_venue_upcoming_shows(venue))
-  }
-  
-  return render_template('pages/show_venue.html', venue=data)
+  detail = render_venue_detail(venue_id=venue_id)
+  if detail is None:
+    abort(404)
+  return render_template('pages/show_venue.html', detail={'name': detail['name'], 'html': Markup(detail['html'])})
+
+@page_cache.cached('venue')
+def render_venue_detail(venue_id):
+  data = load_detail('venue', venue_id)
+  if data is None:
+    return None
+  if data['upcoming_shows']:
+    page_cache.expire_at(data['upcoming_shows'][0]['start_time'])
+  return {'name': data['name'], 'html': render_template('pages/venue_detail.html', venue=data)}
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@views.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@views.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   form = VenueForm(request.form)
   if form.validate():
@@ -163,7 +161,7 @@ def create_venue_submission():
         state=form.state.data,
         address=form.address.data,
         phone=form.phone.data,
-        genres=",".join(form.genres.data),
+        genres=form.genres.data,
         facebook_link=form.facebook_link.data,
         image_link=form.image_link.data,
         website = form.website_link.data,
@@ -172,65 +170,68 @@ def create_venue_submission():
       )
       db.session.add(venue)
       db.session.commit()
+      search.index('venue', venue)
       flash('Venue: {0} created successfully'.format(venue.name))
     except Exception as err:
       flash('An error occurred creating the Venue: {0}. Error: {1}'.format(venue.name, err))
       db.session.rollback()
     finally:
       db.session.close()
-      return redirect(url_for('index')) 
+      return redirect(url_for('.index')) 
   else:
       return render_template('forms/new_venue.html', form=form)
       
     
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@views.route('/venues/<int:venue_id>', methods=['DELETE'])
+@query_stats.budget(1)
 def delete_venue(venue_id):
-  error = False
-  try:
-    Show.query.filter_by(venue_id=venue_id).delete()
-    Venue.query.filter_by(id=venue_id).delete()
-    db.session.commit()
-  except:
-    db.session.rollback()
-    error = True
-    print(sys.exc_info())
-  finally:
-    db.session.close()
-  if not error:
-    return render_template('pages/home.html'), 200
-  else:
-    abort(500)
+  # the shows go with the venue, which can take a while; the worker does
+  # it (delete_venue_job) and /api/jobs/<id> tells when it is done
+  job = jobs.enqueue('delete-venue', venue_id=venue_id)
+  # read before the commit expires it
+  status = {'id': job.id, 'state': job.state, 'url': url_for('api.job_status', job_id=job.id)}
+  db.session.commit()
+  return jsonify(status), 202
 
   # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
   # clicking that button delete it from the db then redirect the user to the homepage
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@views.route('/artists')
+@db.read_only
+@query_stats.budget(1)
+@compression.level(br=5)
 def artists():
   data = []
-  all_artists = Artist.query.all()
-  for artist in all_artists:
+  page = paginate(
+    filter_genres(db.session.query(Artist.id, Artist.name), Artist, get_genre_args()),
+    [Artist.name, Artist.id],
+    key=lambda artist: (artist.name, artist.id)
+  )
+  for artist in page.items:
     obj = {
       'id': artist.id,
       'name': artist.name
     }
     data.append(obj)
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, page=page)
 
-@app.route('/artists/search', methods=['POST'])
+@views.route('/artists/search', methods=['POST'])
+@db.read_only
+@query_stats.budget(2)
 def search_artists():
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
   search_term = request.form['search_term'].lower().strip()
-  artists_in_search = db.session.query(Artist).filter(db.func.lower(Artist.name).like('%' + search_term + '%') | db.func.lower(Artist.city).like('%' + search_term + '%') | db.func.lower(Artist.state).like('%' + search_term + '%')).all()
+  artists_in_search = [artist for artist in get_loader('artist').load_many(search.search('artist', search_term, genres=get_genre_args())) if artist is not None]
   data = []
   for artist in artists_in_search:
     obj = {
       'id': artist.id,
       'name': artist.name,
-      'num_upcoming_shows': len(get_venue_upcoming_shows(artist))
+      'num_upcoming_shows': artist.upcoming_shows_count
     }
     data.append(obj)
   
@@ -241,43 +242,35 @@ def search_artists():
 
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
-@app.route('/artists/<int:artist_id>')
+@views.route('/artists/<int:artist_id>')
+@db.read_only
+@query_stats.budget(1)
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
-  artist = Artist.query.get(artist_id)
-  all_past_shows = get_artist_past_shows(artist)
-  all_upcoming_shows = get_artist_upcoming_shows(artist)
-  
-  data = {
-    "id": artist.id,
-    "name": artist.name,
-    "genres": artist.genres.split(','),
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "website": artist.website,
-    "facebook_link": artist.facebook_link,
-    "seeking_venue": artist.seeking_venue,
-    "seeking_description": artist.seeking_description,
-    "image_link": artist.image_link,
-    "past_shows": get_venue_data_in_shows(all_past_shows),
-    "upcoming_shows": get_venue_data_in_shows(all_upcoming_shows),
-    "past_shows_count": len(get_artist_past_shows(artist)),
-    "upcoming_shows_count": len(get_artist_upcoming_shows(artist))
-  }
-  
-  return render_template('pages/show_artist.html', artist=data)
+  detail = render_artist_detail(artist_id=artist_id)
+  if detail is None:
+    abort(404)
+  return render_template('pages/show_artist.html', detail={'name': detail['name'], 'html': Markup(detail['html'])})
+
+@page_cache.cached('artist')
+def render_artist_detail(artist_id):
+  data = load_detail('artist', artist_id)
+  if data is None:
+    return None
+  if data['upcoming_shows']:
+    page_cache.expire_at(data['upcoming_shows'][0]['start_time'])
+  return {'name': data['name'], 'html': render_template('pages/artist_detail.html', artist=data)}
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@views.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_stats.budget(2)
 def edit_artist(artist_id):
-  form = ArtistForm()
   selected_artist = Artist.query.get(artist_id)
   artist={
     "id": selected_artist.id,
     "name": selected_artist.name,
-    "genres": selected_artist.genres.split(','),
+    "genres": list(selected_artist.genres),
     "city": selected_artist.city,
     "state": selected_artist.state,
     "phone": selected_artist.phone,
@@ -287,11 +280,10 @@ def edit_artist(artist_id):
     "seeking_description": selected_artist.seeking_description,
     "image_link": selected_artist.image_link
   }
-  
-  # TODO: populate form with fields from artist with ID <artist_id>
+  form = ArtistForm(data=artist)
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@views.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   form = ArtistForm(request.form)
   if form.validate():
@@ -301,7 +293,7 @@ def edit_artist_submission(artist_id):
       artist.city = form.city.data
       artist.state = form.state.data
       artist.phone = form.phone.data
-      artist.genres = ",".join(form.genres.data)
+      artist.genres = form.genres.data
       artist.facebook_link = form.facebook_link.data
       artist.image_link = form.image_link.data
       artist.website = form.website_link.data
@@ -309,25 +301,28 @@ def edit_artist_submission(artist_id):
       artist.seeking_description = form.seeking_description.data
 
       db.session.commit()
+      search.index('artist', artist)
+      page_cache.invalidate('artist', [artist_id])
+      page_cache.invalidate('venue', get_venue_ids_for_artist(artist_id))
       flash('Artist: {0} updated successfully'.format(artist.name))
     except Exception as err:
       flash('An error occurred while editing the Artist: {0}. Error: {1}'.format(artist.name, err))
       db.session.rollback()
     finally:
       db.session.close()
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('.show_artist', artist_id=artist_id))
   else:
     flash('Input Error: Check the values you enterred')
-    return redirect(url_for('edit_artist', artist_id=artist_id))
+    return redirect(url_for('.edit_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@views.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_stats.budget(2)
 def edit_venue(venue_id):
-  form = VenueForm()
   selected_venue = Venue.query.get(venue_id)
   venue={
     "id": selected_venue.id,
     "name": selected_venue.name,
-    "genres": selected_venue.genres.split(','),
+    "genres": list(selected_venue.genres),
     "address": selected_venue.address,
     "city": selected_venue.city,
     "state": selected_venue.state,
@@ -338,9 +333,10 @@ def edit_venue(venue_id):
     "seeking_description": selected_venue.seeking_description,
     "image_link": selected_venue.image_link
   }
+  form = VenueForm(data=venue)
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@views.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   form = VenueForm(request.form)
   if form.validate():
@@ -351,7 +347,7 @@ def edit_venue_submission(venue_id):
       venue.state = form.state.data
       venue.address = form.address.data
       venue.phone = form.phone.data
-      venue.genres = ",".join(form.genres.data)
+      venue.genres = form.genres.data
       venue.facebook_link = form.facebook_link.data
       venue.image_link = form.image_link.data
       venue.website = form.website_link.data
@@ -359,27 +355,30 @@ def edit_venue_submission(venue_id):
       venue.seeking_description = form.seeking_description.data
 
       db.session.commit()
+      search.index('venue', venue)
+      page_cache.invalidate('venue', [venue_id])
+      page_cache.invalidate('artist', get_artist_ids_for_venue(venue_id))
       flash('Venue: {0} updated successfully'.format(venue.name))
     except Exception as err:
       flash('An error occurred while editing the Venue: {0}. Error: {1}'.format(venue.name, err))
       db.session.rollback()
     finally:
       db.session.close()
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('.show_venue', venue_id=venue_id))
   else:
     flash('Input Error: Check the values you enterred')
-    return redirect(url_for('edit_venue', venue_id=venue_id))
+    return redirect(url_for('.edit_venue', venue_id=venue_id))
     
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@views.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@views.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # called upon submitting the new artist listing form
   form = ArtistForm(request.form)
@@ -390,7 +389,7 @@ def create_artist_submission():
           city=form.city.data,
           state=form.state.data,
           phone=form.phone.data,
-          genres=",".join(form.genres.data),
+          genres=form.genres.data,
           facebook_link=form.facebook_link.data,
           image_link=form.image_link.data,
           website = form.website_link.data,
@@ -399,13 +398,14 @@ def create_artist_submission():
       )
       db.session.add(artist)
       db.session.commit()
+      search.index('artist', artist)
       flash('Venue: {0} created successfully'.format(artist.name))
     except Exception as err:
       flash('An error occurred creating the Venue: {0}. Error: {1}'.format(artist.name, err))
       db.session.rollback()
     finally:
       db.session.close()
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
   else:
     return render_template('forms/new_artist.html', form=form)
     
@@ -413,36 +413,43 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@views.route('/shows')
+@db.read_only
+@query_stats.budget(3)
+@compression.level(br=5)
 def shows():
-  # displays list of shows at /shows
-  
-  details = db.session.query(Show, Artist, Venue).join(Artist).join(Venue).all()
+  # displays list of shows at /shows, archived shows included
+  shows = shows_between().subquery('shows')
+  page = paginate(
+    db.session.query(shows),
+    [shows.c.start_time, shows.c.id],
+    key=lambda show: (show.start_time, show.id)
+  )
+  all_shows = page.items
+  artists = get_loader('artist').load_many(show.artist_id for show in all_shows)
+  venues = get_loader('venue').load_many(show.venue_id for show in all_shows)
   data = []
-  for detail in details:
+  for show, artist, venue in zip(all_shows, artists, venues):
     obj = {}
-    show = detail[0]
-    artist = detail[1]
-    venue = detail[2]
   
     obj['venue_id'] = venue.id
     obj['venue_name'] = venue.name
     obj['artist_id'] = artist.id
     obj['artist_name'] = artist.name
     obj['artist_image_link'] = artist.image_link
-    obj['start_time'] = str(show.start_time)
+    obj['start_time'] = show.start_time
     
     data.append(obj)
     
-  return render_template('pages/shows.html', shows=data)
+  return render_template('pages/shows.html', shows=data, page=page)
 
-@app.route('/shows/create')
+@views.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@views.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   
@@ -454,7 +461,10 @@ def create_show_submission():
         start_time = form.start_time.data 
     )
     db.session.add(show)
+    record_show_created(show)
     db.session.commit()
+    page_cache.invalidate('venue', [show.venue_id])
+    page_cache.invalidate('artist', [show.artist_id])
     flash('Show was successfully listed!')  
   except Exception as err:
     flash('An error occurred. Show could not be listed.')
@@ -462,54 +472,209 @@ def create_show_submission():
   finally:
     db.session.close()
   
-  return redirect(url_for('index'))
-
-def get_venue_upcoming_shows(venue):
-  upcoming_shows = db.session.query(Show).join(Artist).filter(Show.venue_id==venue.id).filter(Show.start_time > datetime.now()).all()
-  return upcoming_shows
-def get_venue_past_shows(venue):
-  past_shows = db.session.query(Show).join(Artist).filter(Show.venue_id==venue.id).filter(Show.start_time < datetime.now()).all()
-  return past_shows
-def get_artist_upcoming_shows(artist):
-  upcoming_shows = db.session.query(Show).join(Venue).filter(Show.artist_id==artist.id).filter(Show.start_time > datetime.now()).all()
-  return upcoming_shows
-def get_artist_past_shows(artist):
-  past_shows = db.session.query(Show).join(Venue).filter(Show.artist_id==artist.id).filter(Show.start_time < datetime.now()).all()
-  return past_shows
-def get_artist_data_in_shows(shows):
-  shows_list = []
-  for show in shows:
-    obj = {
-      'artist_id': show.artist_id,
-      'start_time': str(show.start_time),
-      'artist_image_link': Artist.query.get(show.artist_id).name,
-      'artist_name': Artist.query.get(show.artist_id).image_link
-    }
-    shows_list.append(obj)
-  return shows_list
-def get_venue_data_in_shows(shows):
-  shows_list = []
-  for show in shows:
-    obj = {
-      'venue_id': show.venue_id,
-      'start_time': str(show.start_time),
-      'venue_image_link': Venue.query.get(show.venue_id).name,
-      'venue_name': Venue.query.get(show.venue_id).image_link
-    }
-    shows_list.append(obj)
-  return shows_list
+  return redirect(url_for('.index'))
 
+#  Jobs
+#  ----------------------------------------------------------------
+#  Run by `flask worker`; see jobs.py.
+
+@jobs.task('delete-venue')
+def delete_venue_job(venue_id):
+  artist_ids = get_artist_ids_for_venue(venue_id)
+  record_venue_shows_deleted(venue_id)
+  Show.query.filter_by(venue_id=venue_id).delete()
+  ShowArchive.query.filter_by(venue_id=venue_id).delete()
+  VenueGenre.query.filter_by(venue_id=venue_id).delete()
+  # an ORM delete, so the session hooks publish which venue went
+  # (recent.py, typeahead.py)
+  venue = Venue.query.get(venue_id)
+  if venue is not None:
+    db.session.delete(venue)
+  db.session.commit()
+  search.remove('venue', venue_id)
+  page_cache.invalidate('venue', [venue_id])
+  page_cache.invalidate('artist', artist_ids)
+
+@jobs.task('rollover-shows')
+def rollover_shows_job():
+  moved = rollover_shows()
+  db.session.commit()
+  return {'moved': moved}
+
+@jobs.task('recompute-counters')
+def recompute_counters_job():
+  recompute_show_counters()
+  db.session.commit()
+
+@jobs.task('archive-shows')
+def archive_shows_job(days=None, batch_size=ARCHIVE_BATCH_SIZE):
+  if days is None:
+    days = current_app.config['SHOW_ARCHIVE_DAYS']
+  moved, partitions, created = archive_shows(days, batch_size, current_app.config['SHOW_PARTITION_MONTHS_AHEAD'])
+  return {'moved': moved, 'partitions': len(partitions), 'created': created}
+
+@jobs.task('warmup')
+def warmup_job():
+  return {'templates': compile_templates()}
+
+def get_artist_ids_for_venue(venue_id):
+  return list(set(db.session.execute(shows_of('venue_id', venue_id, 'artist_id')).scalars()))
+def get_venue_ids_for_artist(artist_id):
+  return list(set(db.session.execute(shows_of('artist_id', artist_id, 'venue_id')).scalars()))
+
+#  Maintenance
+#  ----------------------------------------------------------------
 
-@app.errorhandler(404)
+@views.cli.command('rollover-shows')
+def rollover_shows_command():
+  # run on a schedule (e.g. cron, or JOB_SCHEDULE) to move started shows into the past counters
+  moved = rollover_shows_job()['moved']
+  print('Moved {0} shows from upcoming to past'.format(moved))
+
+@views.cli.command('recompute-counters')
+def recompute_counters_command():
+  recompute_counters_job()
+  print('Show counters recomputed')
+
+@views.cli.command('archive-shows')
+@click.option('--days', type=int, help='Archive shows that started more than this many days ago [default: SHOW_ARCHIVE_DAYS].')
+@click.option('--batch-size', default=ARCHIVE_BATCH_SIZE, show_default=True)
+def archive_shows_command(days, batch_size):
+  # run on a schedule (e.g. nightly) to keep the show table small
+  result = archive_shows_job(days, batch_size)
+  print('Archived {0} shows and {1} partitions'.format(result['moved'], result['partitions']))
+  if result['created']:
+    print('Created partitions {0}'.format(', '.join(result['created'])))
+
+@views.cli.command('import')
+@click.option('--venues', type=click.Path(exists=True, dir_okay=False), help='CSV or NDJSON file of venues.')
+@click.option('--artists', type=click.Path(exists=True, dir_okay=False), help='CSV or NDJSON file of artists.')
+@click.option('--shows', type=click.Path(exists=True, dir_okay=False), help='CSV or NDJSON file of shows.')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True)
+def import_command(venues, artists, shows, batch_size):
+  # bulk-loads a catalog; see importer.py for the file format
+  importer = CatalogImporter(batch_size=batch_size, echo=click.echo)
+  with current_app.test_request_context():
+    try:
+      if venues:
+        importer.import_venues(venues)
+      if artists:
+        importer.import_artists(artists)
+      if shows:
+        importer.import_shows(shows)
+        recompute_show_counters()
+      importer.finish()
+      db.session.commit()
+    except:
+      db.session.rollback()
+      raise
+  page_cache.clear()
+  # the importer inserts rows without the ORM, which the session hooks don't see
+  recent.publish([('reload', 'venue', None, None), ('reload', 'artist', None, None)])
+
+@views.cli.group('assets')
+def assets_command():
+  # static asset bundles; see assets.py
+  pass
+
+@assets_command.command('build')
+def build_assets_command():
+  for name, filename in assets.build().items():
+    print('{0} -> {1}'.format(name, filename))
+
+@views.cli.command('create-search-index')
+def create_search_index_command():
+  # the migrations create these too; this is for databases built with create_all()
+  search.create_schema()
+  print('Search index created')
+
+
+@views.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@views.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+def compile_templates():
+  # compiles every template into the bytecode cache, so new workers load
+  # them instead of compiling them on their first requests
+  names = current_app.jinja_env.list_templates(extensions=['html'])
+  for name in names:
+    current_app.jinja_env.get_template(name)
+  return len(names)
+
+@views.cli.command('warmup')
+def warmup_command():
+  print('Compiled {0} templates'.format(compile_templates()))
+
+@views.cli.command('worker')
+@click.option('--threads', type=int, help='Jobs run at once [default: JOB_WORKER_THREADS].')
+@click.option('--once', is_flag=True, help='Exit once no job is due instead of waiting for more.')
+def worker_command(threads, once):
+  # runs the background jobs; see jobs.py
+  jobs.work(threads, once, echo=click.echo)
+
+@views.cli.command('enqueue')
+@click.argument('name', type=click.Choice(sorted(jobs.tasks)))
+@click.option('--arg', 'args', multiple=True, metavar='KEY=VALUE', help='A task argument; VALUE is read as JSON if it parses.')
+@click.option('--delay', type=float, default=0, help='Seconds to wait before running it.')
+def enqueue_command(name, args, delay):
+  kwargs = {}
+  for arg in args:
+    key, _, value = arg.partition('=')
+    try:
+      kwargs[key] = json.loads(value)
+    except ValueError:
+      kwargs[key] = value
+  job = jobs.enqueue(name, run_at=datetime.now() + timedelta(seconds=delay), **kwargs)
+  db.session.commit()
+  print('Queued job {0}'.format(job.id))
+
+#----------------------------------------------------------------------------#
+# App Factory.
+#----------------------------------------------------------------------------#
+
+def create_app(config=None):
+  app = Flask(__name__)
+  app.config.from_object('config')
+  app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+  if config is not None:
+    app.config.update(config)
+
+  # compiled templates are kept on disk across restarts; Jinja recompiles
+  # the ones whose source changed
+  cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+  if cache_dir is not None:
+    os.makedirs(cache_dir, exist_ok=True)
+  app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+  app.config.setdefault('DATETIME_FORMAT_CACHE_SIZE', 16384)
+  app.extensions['datetime_format_cache'] = functools.lru_cache(
+      maxsize=app.config['DATETIME_FORMAT_CACHE_SIZE'])(format_datetime_uncached)
+  app.jinja_env.filters['datetime'] = format_datetime
+  app.jinja_env.globals['genre_choices'] = GENRE_VALUES
+
+  db.init_app(app)
+  # flask_migrate imports alembic, which only the `flask db` commands use;
+  # skip it unless the app is created for a command
+  if click.get_current_context(silent=True) is not None:
+    from flask_migrate import Migrate
+    Migrate(app, db)
+  search.init_app(app, recent)
+  page_cache.init_app(app, recent)
+  query_stats.init_app(app)
+  metrics.init_app(app, db)
+  recent.init_app(app, db)
+  typeahead.init_app(app, recent)
+  assets.init_app(app)
+  compression.init_app(app)
+  jobs.init_app(app)
+  app.register_blueprint(views)
+  app.register_blueprint(api)
+
+  if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
@@ -519,17 +684,19 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+  return app
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
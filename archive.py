@@ -0,0 +1,145 @@
+import re
+from datetime import date, datetime, timedelta
+
+from counters import rollover_shows
+from models import db, Show, ShowArchive
+
+#----------------------------------------------------------------------------#
+# Show archive.
+#----------------------------------------------------------------------------#
+# archive_shows() moves every show that started more than SHOW_ARCHIVE_DAYS
+# ago from show to show_archive, so the show table, and the indexes the
+# upcoming-show queries walk, only hold recent and upcoming shows. Archived
+# shows are still past shows: the detail pages read both tables and the
+# counters keep counting them.
+#
+# On PostgreSQL the migrations partition both tables by start_time, one
+# show_pYYYY_MM partition per month plus a default partition. There a month
+# that ended before the horizon is detached from show and attached to
+# show_archive as it is, without copying rows, and partitions are created
+# SHOW_PARTITION_MONTHS_AHEAD months ahead so new shows don't pile up in the
+# default partition. Rows older than the horizon that are left, in the
+# current month or the default partition, and every row on other databases,
+# are copied and deleted in batches.
+
+DEFAULT_BATCH_SIZE = 5000
+
+PARTITION_NAME = re.compile(r'^show_p(\d{4})_(\d{2})$')
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _is_partitioned(table):
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(
+        db.text('SELECT relkind FROM pg_class WHERE oid = CAST(:table AS regclass)'), {'table': table}
+    ).scalar() == 'p'
+
+
+def _partitions(parent):
+    # {first day of the month: partition name} of the monthly partitions.
+    names = db.session.execute(db.text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = CAST(:parent AS regclass)'
+    ), {'parent': parent}).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def _attach(parent, name, month):
+    # Rows of the month that ended up in the default partition move into
+    # the partition first, or the default partition would fail the attach.
+    end = _add_months(month, 1)
+    bounds = {'start': month, 'end': end}
+    columns = 'id, start_time, artist_id, venue_id, is_past'
+    db.session.execute(db.text(
+        'INSERT INTO {0} ({1}) SELECT {1} FROM {2}_default '
+        'WHERE start_time >= :start AND start_time < :end'.format(name, columns, parent)
+    ), bounds)
+    db.session.execute(db.text(
+        'DELETE FROM {0}_default WHERE start_time >= :start AND start_time < :end'.format(parent)
+    ), bounds)
+    db.session.execute(db.text(
+        "ALTER TABLE {0} ATTACH PARTITION {1} FOR VALUES FROM ('{2}') TO ('{3}')".format(parent, name, month, end)
+    ))
+
+
+def create_partitions(months_ahead, now=None):
+    # Creates the show partitions missing from this month to `months_ahead`
+    # months ahead. Returns their names.
+    if now is None:
+        now = datetime.now()
+    hot = _partitions('show')
+    archived = _partitions('show_archive')
+    created = []
+    this_month = now.date().replace(day=1)
+    for month in (_add_months(this_month, count) for count in range(months_ahead + 1)):
+        if month in hot or month in archived:
+            continue
+        name = 'show_p{0:%Y_%m}'.format(month)
+        db.session.execute(db.text('CREATE TABLE {0} (LIKE show INCLUDING DEFAULTS)'.format(name)))
+        _attach('show', name, month)
+        created.append(name)
+    return created
+
+
+def _archive_partitions(horizon):
+    # Moves the months that ended before the horizon. Returns their names.
+    moved = []
+    for month, name in sorted(_partitions('show').items()):
+        if _add_months(month, 1) > horizon.date():
+            break
+        db.session.execute(db.text('ALTER TABLE show DETACH PARTITION {0}'.format(name)))
+        _attach('show_archive', name, month)
+        moved.append(name)
+    return moved
+
+
+def _archive_rows(horizon, batch_size):
+    # Copies and deletes shows older than the horizon in batches of
+    # `batch_size`, committing each. Returns the number of shows moved.
+    columns = [Show.id, Show.start_time, Show.artist_id, Show.venue_id, Show.is_past]
+    old = Show.start_time < horizon
+    moved = 0
+    while True:
+        ids = [id for id, in db.session.query(Show.id).filter(old).order_by(Show.start_time).limit(batch_size)]
+        if not ids:
+            return moved
+        batch = old & Show.id.in_(ids)
+        db.session.execute(ShowArchive.__table__.insert().from_select(
+            [column.key for column in columns], db.select(*columns).where(batch)
+        ))
+        db.session.execute(Show.__table__.delete().where(batch))
+        db.session.commit()
+        moved += len(ids)
+
+
+def archive_shows(days, batch_size=DEFAULT_BATCH_SIZE, months_ahead=0, now=None):
+    # Moves shows that started more than `days` days ago to the archive and,
+    # when show is partitioned, creates partitions `months_ahead` months
+    # ahead. Commits as it goes. Returns (shows moved, partitions moved,
+    # partitions created); the partition lists are empty unless show is
+    # partitioned.
+    if now is None:
+        now = datetime.now()
+    horizon = now - timedelta(days=days)
+    # Archived shows must already be counted as past.
+    rollover_shows(now)
+    db.session.commit()
+
+    partitions = []
+    created = []
+    if _is_partitioned('show'):
+        partitions = _archive_partitions(horizon)
+        created = create_partitions(months_ahead, now)
+        db.session.commit()
+    return _archive_rows(horizon, batch_size), partitions, created
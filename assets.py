@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import brotli
+import rcssmin
+import rjsmin
+from flask import current_app, request, send_from_directory, url_for
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#----------------------------------------------------------------------------#
+# `flask assets build` concatenates the stylesheets and scripts in BUNDLES,
+# minifies the ones that are not minified already and writes each bundle to
+# static/dist/ under a name carrying a hash of its content, with .gz and .br
+# variants next to it and a manifest.json mapping bundle names to files.
+#
+# Templates call asset_urls(name) for the URLs to include: the built file,
+# or the source files when no build exists, as in development. Built files
+# are served by a handler that picks the variant matching Accept-Encoding
+# and marks them immutable for a year; a new build means new file names.
+#
+# Bundles keep the static/<type>/ depth so relative url()s still resolve.
+
+BUNDLES = {
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                 'css/main.responsive.css', 'css/main.quickfix.css'],
+    # Loaded in <head>: pages use moment in inline scripts.
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    # Deferred; needs jQuery, which main.html loads from a CDN first.
+    'main.js': ['js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js', 'js/script.js'],
+}
+
+BUILD_DIR = 'dist'
+
+# (Content-Encoding, file suffix) in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _minify(path, source):
+    if '.min.' in os.path.basename(path):
+        return source
+    if path.endswith('.css'):
+        return rcssmin.cssmin(source)
+    return rjsmin.jsmin(source)
+
+
+class Assets:
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        # per app: the manifest last read, and its file's mtime
+        app.extensions['assets'] = {'manifest': None, 'mtime': None}
+        app.add_url_rule('/static/{0}/<path:filename>'.format(BUILD_DIR), 'assets', self.serve)
+        app.add_template_global(self.asset_urls)
+
+    @property
+    def build_dir(self):
+        return os.path.join(current_app.static_folder, BUILD_DIR)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.build_dir, 'manifest.json')
+
+    def build(self):
+        # Writes every bundle and its compressed variants, removes the files
+        # of earlier builds and returns the new manifest.
+        os.makedirs(self.build_dir, exist_ok=True)
+        manifest = {}
+        for name, sources in BUNDLES.items():
+            parts = []
+            for source in sources:
+                with open(os.path.join(current_app.static_folder, source), encoding='utf-8') as f:
+                    parts.append(_minify(source, f.read()).strip())
+            # A semicolon keeps concatenated scripts from running together.
+            separator = '\n' if name.endswith('.css') else ';\n'
+            content = (separator.join(parts) + '\n').encode('utf-8')
+            stem, extension = os.path.splitext(name)
+            filename = '{0}.{1}{2}'.format(stem, hashlib.sha256(content).hexdigest()[:16], extension)
+            self._write(filename, content)
+            self._write(filename + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            self._write(filename + '.br', brotli.compress(content, quality=11))
+            manifest[name] = filename
+        keep = set(manifest.values())
+        for filename in os.listdir(self.build_dir):
+            for suffix in ('', '.gz', '.br'):
+                if filename.endswith(suffix) and filename[:len(filename) - len(suffix)] in keep:
+                    break
+            else:
+                if filename != 'manifest.json':
+                    os.remove(os.path.join(self.build_dir, filename))
+        self._write('manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        current_app.extensions['assets']['manifest'] = None
+        return manifest
+
+    def _write(self, filename, content):
+        # Through a temporary file, so workers never serve a partial file.
+        path = os.path.join(self.build_dir, filename)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+    def get_manifest(self):
+        # Reread when a build replaced the file.
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        state = current_app.extensions['assets']
+        if state['manifest'] is None or mtime != state['mtime']:
+            with open(self.manifest_path) as f:
+                state['manifest'] = json.load(f)
+            state['mtime'] = mtime
+        return state['manifest']
+
+    def asset_urls(self, name):
+        filename = self.get_manifest().get(name)
+        if filename is not None:
+            return [url_for('assets', filename=filename)]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def serve(self, filename):
+        accepted = request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding, suffix = None, ''
+        for candidate, candidate_suffix in ENCODINGS:
+            if accepted[candidate] and os.path.isfile(os.path.join(self.build_dir, filename + candidate_suffix)):
+                encoding, suffix = candidate, candidate_suffix
+                break
+        response = send_from_directory(self.build_dir, filename + suffix, mimetype=mimetype,
+                                       max_age=current_app.config['ASSETS_MAX_AGE'])
+        if encoding is not None:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
@@ -0,0 +1,106 @@
+"""Synthetic catalog generator shared by the benchmarks.
+
+    seed_catalog(venues=1000, artists=1000, shows=10000)
+
+Fills the database bound to `db` (create the schema first) with
+deterministic venues, artists and shows: the same arguments always produce
+the same rows. Shows are spread over the year before and after now, so the
+detail pages have both past and upcoming shows.
+"""
+import random
+from datetime import datetime, timedelta
+
+from counters import recompute_show_counters
+from models import db, Venue, Artist, Show, VenueGenre, ArtistGenre, GENRE_VALUES
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Denver', 'CO'),
+          ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Portland', 'OR'),
+          ('Boston', 'MA')]
+
+NAME_WORDS = ['Musical', 'Hop', 'Park', 'Square', 'Live', 'Music', 'Coffee',
+              'Dueling', 'Pianos', 'Bar', 'Guns', 'Roses', 'Matt', 'Quevedo',
+              'Wild', 'Sax', 'Band', 'Hall', 'Lounge', 'Garden', 'Theatre',
+              'Blue', 'Note', 'Echo', 'Velvet', 'Room', 'Club', 'Station']
+
+BATCH_SIZE = 10000
+
+
+def sizes_for(shows):
+    # Venue and artist counts for a catalog of `shows` shows: ten shows per
+    # venue and per artist on average.
+    return max(shows // 10, 10), max(shows // 10, 10)
+
+
+def _name(rng, id):
+    return '{0} {1} {2}'.format(rng.choice(NAME_WORDS), rng.choice(NAME_WORDS), id)
+
+
+def _phone(rng):
+    return '{0:03d}-{1:03d}-{2:04d}'.format(rng.randint(200, 999), rng.randint(100, 999), rng.randint(0, 9999))
+
+
+def _genres(rng):
+    return rng.sample(GENRE_VALUES, rng.randint(1, 3))
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + BATCH_SIZE])
+
+
+def seed_catalog(venues, artists, shows, seed=0, now=None):
+    rng = random.Random(seed)
+    now = now or datetime.now()
+
+    venue_rows = []
+    venue_genres = []
+    for id in range(1, venues + 1):
+        city, state = rng.choice(CITIES)
+        venue_rows.append({
+            'id': id, 'name': _name(rng, id), 'city': city, 'state': state,
+            'address': '{0} Main St'.format(rng.randint(1, 9999)), 'phone': _phone(rng),
+            'image_link': 'https://images.example.com/venues/{0}.jpg'.format(id),
+            'facebook_link': 'https://www.facebook.com/venue{0}'.format(id),
+            'website': 'https://venue{0}.example.com'.format(id),
+            'seeking_talent': rng.random() < 0.5, 'seeking_description': '',
+            'upcoming_shows_count': 0, 'past_shows_count': 0
+        })
+        venue_genres.extend({'venue_id': id, 'genre': genre} for genre in _genres(rng))
+
+    artist_rows = []
+    artist_genres = []
+    for id in range(1, artists + 1):
+        city, state = rng.choice(CITIES)
+        artist_rows.append({
+            'id': id, 'name': _name(rng, id), 'city': city, 'state': state,
+            'phone': _phone(rng),
+            'image_link': 'https://images.example.com/artists/{0}.jpg'.format(id),
+            'facebook_link': 'https://www.facebook.com/artist{0}'.format(id),
+            'website': 'https://artist{0}.example.com'.format(id),
+            'seeking_venue': rng.random() < 0.5, 'seeking_description': '',
+            'upcoming_shows_count': 0, 'past_shows_count': 0
+        })
+        artist_genres.extend({'artist_id': id, 'genre': genre} for genre in _genres(rng))
+
+    show_rows = sorted(({
+        'artist_id': rng.randint(1, artists), 'venue_id': rng.randint(1, venues),
+        'start_time': now + timedelta(minutes=rng.randint(-60 * 24 * 365, 60 * 24 * 365)),
+        'is_past': False
+    } for _ in range(shows)), key=lambda row: (row['artist_id'], row['venue_id']))
+
+    _insert(Venue, venue_rows)
+    _insert(VenueGenre, venue_genres)
+    _insert(Artist, artist_rows)
+    _insert(ArtistGenre, artist_genres)
+    _insert(Show, show_rows)
+    recompute_show_counters(now)
+    if db.engine.dialect.name == 'postgresql':
+        for table in ('venue', 'artist'):
+            db.session.execute(db.text(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce(max(id), 1)) FROM {0}".format(table)
+            ))
+    db.session.commit()
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
@@ -0,0 +1,90 @@
+"""Query count check for the listing and detail pages.
+
+Seeds a scratch database with --venues venues, then ten times as many, and
+requests each listed page through the Flask test client while counting the
+SQL statements it runs. Fails unless every page runs its expected number
+of statements at both sizes, so a page whose queries grow with the data
+(an N+1) is caught before it ships. Query budgets are enforced as well
+(SQL_QUERY_BUDGET_STRICT), so a view over its @query_stats.budget fails.
+
+    python benchmarks/check_query_counts.py [--database-url URL] [--venues 200]
+
+Defaults to a scratch SQLite file; --database-url must point at an empty
+database, which is dropped and recreated for each size.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app
+from catalog import seed_catalog
+from models import db
+
+app = create_app()
+
+# (path, statements it may run)
+PAGES = [
+    ('/venues', 1),
+    ('/venues?genre=Jazz', 1),
+    ('/venues/1', 1),
+    ('/artists/1', 1),
+]
+
+
+def count_statements(client, path):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(path)
+        response.get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    assert response.status_code == 200, (path, response.status_code)
+    return statements
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url')
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_counts.db')
+    app.config['PAGE_CACHE_BACKEND'] = None
+    app.config['SQL_QUERY_BUDGET_STRICT'] = True
+
+    failures = 0
+    client = app.test_client()
+    for venues in (args.venues, args.venues * 10):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            seed_catalog(venues, venues, venues * 10)
+            db.session.remove()
+        for path, expected in PAGES:
+            statements = count_statements(client, path)
+            ok = len(statements) == expected
+            print('{0:6} venues  {1:24} {2} statements  {3}'.format(
+                venues, path, len(statements), 'ok' if ok else 'expected {0}'.format(expected)))
+            if not ok or args.verbose:
+                print('\n'.join(statements))
+            failures += not ok
+    print('{0} pages over their statement count'.format(failures))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Query plan check for the hot read paths.
+
+Seeds a database, requests the listing and detail pages through the Flask
+test client and runs the maintenance jobs while capturing every SQL
+statement they run, then EXPLAINs each statement and fails if any of them
+reads the show, show_archive, venue or artist tables with a sequential scan.
+
+    python benchmarks/check_query_plans.py [--database-url URL] [--shows 10000]
+
+Defaults to a scratch SQLite file. Point --database-url at an empty
+PostgreSQL database (created with `flask db upgrade`) to check the planner
+that runs in production; PostgreSQL only prefers indexes once tables are
+big enough, so keep the dataset at its default size or larger there.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import g
+from sqlalchemy import event
+
+from app import create_app
+from catalog import seed_catalog
+from archive import archive_shows
+from counters import rollover_shows
+from models import db, Show
+
+app = create_app()
+
+TABLES = ('show', 'show_archive', 'venue', 'artist', 'venue_genre', 'artist_genre')
+
+
+def capture(run):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def explain(statement, parameters):
+    # Returns (plan text, list of tables read by a sequential scan).
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = []
+
+        def walk(node):
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in TABLES:
+                scans.append(node['Relation Name'])
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return json.dumps(plan, indent=2), scans
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+        if words[0] == 'SCAN' and words[1] in TABLES and 'INDEX' not in detail:
+            scans.append(words[1])
+    return '\n'.join(row[-1] for row in rows), scans
+
+
+def hot_paths(client):
+    # (name, callable) pairs exercising the queries behind the hot routes.
+    venue_id = db.session.query(Show.venue_id).first()[0]
+    artist_id = db.session.query(Show.artist_id).first()[0]
+    paths = [
+        ('/venues', lambda: client.get('/venues')),
+        ('/venues?genre=Jazz', lambda: client.get('/venues?genre=Jazz')),
+        ('/artists', lambda: client.get('/artists')),
+        ('/shows', lambda: client.get('/shows')),
+        ('/venues/<id>', lambda: client.get('/venues/{0}'.format(venue_id))),
+        ('/artists/<id>', lambda: client.get('/artists/{0}'.format(artist_id))),
+        ('/api/shows time window', lambda: client.get('/api/shows?from={0}&to={1}'.format(
+            datetime.now().date().isoformat(), (datetime.now() + timedelta(days=7)).date().isoformat()))),
+        ('rollover-shows', lambda: (rollover_shows(), db.session.rollback())),
+        # Commits, moving the older half of the shows to the archive. The
+        # requests share this app context's g, so the loaders holding rows
+        # the commit expired are dropped too.
+        ('archive-shows', lambda: (archive_shows(180), g.pop('_loaders', None))),
+        # The show listings again, now that the archive has rows.
+        ('/shows after archiving', lambda: client.get('/shows')),
+        ('/api/shows before the archive horizon', lambda: client.get('/api/shows?from={0}&to={1}'.format(
+            (datetime.now() - timedelta(days=400)).date().isoformat(),
+            (datetime.now() - timedelta(days=393)).date().isoformat()))),
+    ]
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url')
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+    app.config['PAGE_CACHE_BACKEND'] = None
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        seed_catalog(args.venues, args.artists, args.shows)
+        client = app.test_client()
+        for name, run in hot_paths(client):
+            for statement, parameters in capture(run):
+                if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                plan, scans = explain(statement, parameters)
+                if scans or args.verbose:
+                    print('{0}: {1}\n{2}\n{3}\n'.format(
+                        name, 'SEQUENTIAL SCAN on ' + ', '.join(scans) if scans else 'ok', statement, plan))
+                failures += bool(scans)
+        db.session.rollback()
+    print('{0} statements with sequential scans'.format(failures))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Read-after-write check for replica routing.
+
+Seeds a scratch SQLite primary, copies it to a replica file that is never
+updated again (a replica lagging forever), and points a replica_* bind at
+the copy. Then:
+
+- after a client creates a venue with POST /venues/create, its next
+  GET of the new venue's page must find it (read from the primary for
+  DB_READ_AFTER_WRITE_SECONDS);
+- another client, which wrote nothing, must get a 404 for the same page,
+  so the check is really routing reads to the replica.
+
+    python benchmarks/check_read_after_write.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from catalog import seed_catalog
+from models import db, Venue
+from route_benchmark import venue_form
+
+app = create_app()
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    primary = os.path.join(directory, 'primary.db')
+    replica = os.path.join(directory, 'replica.db')
+    app.config.update({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + primary,
+        'SQLALCHEMY_BINDS': {'replica_1': 'sqlite:///' + replica},
+        'PAGE_CACHE_BACKEND': None,
+        'WTF_CSRF_ENABLED': False,
+        'RECENT_BUS_PATH': os.path.join(directory, 'bus.db'),
+    })
+    with app.app_context():
+        db.create_all()
+        seed_catalog(20, 20, 100)
+        db.session.remove()
+        db.get_engine(app).dispose()
+    shutil.copyfile(primary, replica)
+
+    new = venue_form(0)
+    writer = app.test_client()
+    reader = app.test_client()
+    failures = []
+
+    response = writer.post('/venues/create', data=new)
+    if response.status_code not in (200, 302):
+        failures.append('POST /venues/create answered {0}'.format(response.status_code))
+    with app.app_context():
+        venue_id = db.session.query(db.func.max(Venue.id)).scalar()
+        db.session.remove()
+    path = '/venues/{0}'.format(venue_id)
+    status = writer.get(path).status_code
+    if status != 200:
+        failures.append('the writer read the lagging replica after its write: GET {0} {1}'.format(path, status))
+    status = reader.get(path).status_code
+    if status != 404:
+        failures.append('a client that wrote nothing did not read the replica: GET {0} {1}'.format(path, status))
+
+    for failure in failures:
+        print('FAIL ' + failure)
+    print('{0} failures'.format(len(failures)))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
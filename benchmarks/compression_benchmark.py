@@ -0,0 +1,72 @@
+"""Response compression benchmark.
+
+Seeds the synthetic catalog (see catalog.py), fetches the listing pages
+uncompressed and reports, for every gzip and brotli level, the bytes on
+the wire and the CPU time spent compressing each page. Then fetches each
+page once more the way a browser would, to show what the route's
+configured level sends.
+
+    python benchmarks/compression_benchmark.py [--shows 10000] [--page-size 200] [--repeat 3]
+
+--page-size sets PAGE_SIZE; pagination caps it at 200 rows per page.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, page_cache, recent
+from catalog import seed_catalog, sizes_for
+from compression import compress_chunks
+from models import db
+
+app = create_app()
+
+PAGES = ['/shows', '/artists', '/venues', '/api/venues']
+
+LEVELS = [('gzip', level) for level in (1, 6, 9)] + [('br', level) for level in (1, 4, 5, 7, 9, 11)]
+
+
+def measure(body, encoding, level, repeat):
+    # (compressed bytes, CPU milliseconds per compression)
+    start = time.process_time()
+    for _ in range(repeat):
+        size = sum(len(chunk) for chunk in compress_chunks([body], encoding, level))
+    return size, (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'compression.db')
+    app.config['PAGE_SIZE'] = args.page_size
+    with app.app_context():
+        db.create_all()
+        seed_catalog(*sizes_for(args.shows), args.shows)
+        page_cache.clear()
+        recent.clear()
+        db.session.remove()
+
+    client = app.test_client()
+    for page in PAGES:
+        body = client.get(page, headers={'Accept-Encoding': 'identity'}).get_data()
+        print('{0}: {1:,} bytes uncompressed'.format(page, len(body)))
+        for encoding, level in LEVELS:
+            size, cpu = measure(body, encoding, level, args.repeat)
+            print('  {0:4} {1:2}  {2:10,} bytes  {3:5.1f}%  {4:8.2f}ms CPU'.format(
+                encoding, level, size, size / len(body) * 100, cpu))
+        for accept in ('gzip', 'br, gzip'):
+            response = client.get(page, headers={'Accept-Encoding': accept})
+            print('  served for Accept-Encoding: {0:9} {1:4} {2:10,} bytes'.format(
+                accept, response.headers.get('Content-Encoding', '-'), len(response.get_data())))
+
+
+if __name__ == '__main__':
+    main()
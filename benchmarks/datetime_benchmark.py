@@ -0,0 +1,81 @@
+"""`datetime` filter micro-benchmark.
+
+Renders the /shows template with 10k show tiles using the original filter
+(datetime -> str -> dateutil parse -> babel on every call) and the current
+one (native datetimes, compiled patterns, memoized output), with a cold and
+a warm output cache.
+
+    python benchmarks/datetime_benchmark.py [--shows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+from flask import render_template
+
+from app import create_app, format_datetime
+
+app = create_app()
+
+
+def original_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def make_shows(count):
+    # Shows on the hour over the next year, so start times repeat the way
+    # they do in a real listing.
+    rng = random.Random(0)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    return [{
+        'artist_id': i, 'venue_id': i, 'artist_name': 'Artist', 'venue_name': 'Venue',
+        'artist_image_link': '', 'start_time': start + timedelta(hours=rng.randint(0, 24 * 365))
+    } for i in range(count)]
+
+
+def render(shows, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render_template('pages/shows.html', shows=shows, page=None)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    shows = make_shows(args.shows)
+    string_shows = [dict(show, start_time=str(show['start_time'])) for show in shows]
+    with app.test_request_context('/shows'):
+        app.jinja_env.filters['datetime'] = original_format_datetime
+        original = render(string_shows, args.repeat)
+
+        app.jinja_env.filters['datetime'] = format_datetime
+        cold = []
+        for _ in range(args.repeat):
+            app.extensions['datetime_format_cache'].cache_clear()
+            cold.append(render(shows, 1))
+        warm = render(shows, args.repeat)
+
+    print('{0} show tiles per render'.format(args.shows))
+    print('  original filter       {0:9.1f}ms'.format(original))
+    print('  cached, cold output   {0:9.1f}ms'.format(sum(cold) / len(cold)))
+    print('  cached, warm output   {0:9.1f}ms'.format(warm))
+
+
+if __name__ == '__main__':
+    main()
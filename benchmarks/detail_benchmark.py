@@ -0,0 +1,145 @@
+"""Detail page data: sequential, concurrent and single-query loading.
+
+Seeds a scratch SQLite catalog and loads venue and artist detail page data
+three ways: the way the views first did, one query for the entity, one for
+each show list and a batch load of the shows' artists or venues, run one
+after another; the same queries run concurrently on a thread pool, each in
+its own app context and session, so a page waits for its slowest query
+rather than the sum of them; and queries.load_detail(), the one statement
+the views run now. Local SQLite answers in microseconds, so
+--query-latency-ms adds a sleep to every statement to stand in for the
+network round trip to a database server.
+
+    python benchmarks/detail_benchmark.py [--shows 10000] [--requests 200] [--query-latency-ms 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app
+from catalog import seed_catalog, sizes_for
+from loaders import get_loader
+from models import db, Artist, Show, Venue
+from queries import load_detail
+from route_benchmark import percentile
+
+app = create_app()
+
+FIELDS = {
+    'venue': ('id', 'name', 'address', 'city', 'state', 'phone', 'website', 'facebook_link',
+              'seeking_talent', 'seeking_description', 'image_link'),
+    'artist': ('id', 'name', 'city', 'state', 'phone', 'website', 'facebook_link',
+               'seeking_venue', 'seeking_description', 'image_link'),
+}
+
+
+pool = ThreadPoolExecutor(max_workers=4)
+
+
+def load_entity(kind, id):
+    entity = get_loader(kind).load(id)
+    if entity is None:
+        return None
+    data = {field: getattr(entity, field) for field in FIELDS[kind]}
+    data['genres'] = list(entity.genres)
+    return data
+
+
+def load_shows(kind, id, label, now):
+    other = 'artist' if kind == 'venue' else 'venue'
+    counterpart = Artist if kind == 'venue' else Venue
+    when = Show.start_time < now if label == 'past' else Show.start_time > now
+    shows = db.session.query(Show).join(counterpart).filter(getattr(Show, kind + '_id') == id).filter(when).all()
+    others = get_loader(other).load_many(getattr(show, other + '_id') for show in shows)
+    return [{
+        other + '_id': getattr(show, other + '_id'),
+        'start_time': show.start_time,
+        other + '_image_link': show_other.image_link,
+        other + '_name': show_other.name,
+    } for show, show_other in zip(shows, others)]
+
+
+def detail(entity, past, upcoming):
+    if entity is None:
+        return None
+    entity.update(past_shows=past, upcoming_shows=upcoming,
+                  past_shows_count=len(past), upcoming_shows_count=len(upcoming))
+    return entity
+
+
+def load_sequential(kind, id):
+    now = datetime.now()
+    return detail(load_entity(kind, id), load_shows(kind, id, 'past', now), load_shows(kind, id, 'upcoming', now))
+
+
+def in_app_context(function, *args):
+    with app.app_context():
+        try:
+            return function(*args)
+        finally:
+            db.session.remove()
+
+
+def load_concurrent(kind, id):
+    now = datetime.now()
+    futures = [
+        pool.submit(in_app_context, load_entity, kind, id),
+        pool.submit(in_app_context, load_shows, kind, id, 'past', now),
+        pool.submit(in_app_context, load_shows, kind, id, 'upcoming', now),
+    ]
+    return detail(*[future.result() for future in futures])
+
+
+def run(load, kind, ids):
+    timings = []
+    for id in ids:
+        with app.test_request_context():
+            start = time.perf_counter()
+            assert load(kind, id) is not None, (kind, id)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.session.remove()
+    timings.sort()
+    return percentile(timings, 50), percentile(timings, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--query-latency-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'detail.db')
+    venues, artists = sizes_for(args.shows)
+    with app.app_context():
+        db.create_all()
+        seed_catalog(venues, artists, args.shows)
+        engine = db.engine
+
+    def delay(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(args.query_latency_ms / 1000.0)
+
+    event.listen(engine, 'before_cursor_execute', delay)
+    pages = {
+        'venue': [i % venues + 1 for i in range(args.requests)],
+        'artist': [i % artists + 1 for i in range(args.requests)],
+    }
+    print('{0} shows, {1}ms per statement'.format(args.shows, args.query_latency_ms))
+    for kind, ids in pages.items():
+        for label, load in (('sequential', load_sequential), ('concurrent', load_concurrent),
+                            ('one query', load_detail)):
+            run(load, kind, ids[:10])
+            p50, p95 = run(load, kind, ids)
+            print('  {0:<7} {1:<11} p50 {2:7.2f}ms  p95 {3:7.2f}ms'.format(kind, label, p50, p95))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Form page throughput benchmark.
+
+Seeds the synthetic catalog (see catalog.py) and requests the create and
+edit pages through the Flask test client, one request after another, with
+CSRF protection on as in production. Prints requests per second and the
+mean time per request for each page, from the fastest of --rounds rounds.
+
+    python benchmarks/form_benchmark.py [--requests 500] [--rounds 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from catalog import seed_catalog, sizes_for
+from models import db
+
+app = create_app()
+
+PAGES = ['/venues/create', '/artists/create', '/venues/1/edit', '/artists/1/edit']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'forms.db')
+    app.config['WTF_CSRF_ENABLED'] = True
+    with app.app_context():
+        db.create_all()
+        seed_catalog(*sizes_for(1000), 1000)
+        db.session.commit()
+        db.session.remove()
+
+    client = app.test_client()
+    for page in PAGES:
+        # The first request compiles the template and starts the session.
+        assert client.get(page).status_code == 200, page
+        elapsed = float('inf')
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(page)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        print('{0:18} {1:8.0f} requests/s  {2:6.2f}ms per request'.format(
+            page, args.requests / elapsed, elapsed / args.requests * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""Route-level benchmark.
+
+Seeds a database with the synthetic catalog for each size (number of shows;
+see catalog.py), drives every route through the Flask test client and
+records, per route, p50/p95/p99 latency, the number of SQL statements per
+request and the peak Python memory allocated while serving a request.
+
+    python benchmarks/route_benchmark.py [--database-url URL] [--sizes 1000,10000,100000]
+        [--requests 50] [--output results.json] [--baseline baseline.json] [--tolerance 0.25]
+
+Defaults to a scratch SQLite file per size; --database-url must point at an
+empty database, which is dropped and recreated for every size.
+
+With --baseline the results are compared against a stored results file and
+the run exits non-zero when a route issues more queries than the baseline,
+or its p95 latency or peak memory grew by more than --tolerance. A missing
+baseline file is created from the current run.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import create_app, search, page_cache, recent
+from catalog import seed_catalog, sizes_for
+from models import db
+
+app = create_app()
+
+MEMORY_SAMPLES = 5
+
+# p95 growth below this many milliseconds is noise, not a regression.
+MIN_LATENCY_REGRESSION_MS = 1.0
+
+
+def venue_form(i):
+    return {
+        'name': 'Benchmark Venue {0}'.format(i), 'city': 'San Francisco', 'state': 'CA',
+        'address': '1 Main St', 'phone': '415-555-0100', 'genres': ['Jazz', 'Blues'],
+        'facebook_link': 'https://www.facebook.com/benchmark', 'image_link': '',
+        'website_link': '', 'seeking_description': ''
+    }
+
+
+def artist_form(i):
+    return {
+        'name': 'Benchmark Artist {0}'.format(i), 'city': 'San Francisco', 'state': 'CA',
+        'phone': '415-555-0100', 'genres': ['Jazz', 'Blues'],
+        'facebook_link': 'https://www.facebook.com/benchmark', 'image_link': '',
+        'website_link': '', 'seeking_description': ''
+    }
+
+
+def routes(venues, artists):
+    # (name, method, url(i), form data(i) or None) for every route. Read
+    # routes walk through the catalog so detail pages are not all served
+    # from the page cache; DELETE comes last and removes distinct venues.
+    today = datetime.now().date()
+    week = '?from={0}&to={1}'.format(today.isoformat(), (today + timedelta(days=7)).isoformat())
+
+    def venue_id(i):
+        return i % venues + 1
+
+    def artist_id(i):
+        return i % artists + 1
+
+    return [
+        ('GET /', 'GET', lambda i: '/', None),
+        ('GET /venues', 'GET', lambda i: '/venues', None),
+        ('GET /venues?genre', 'GET', lambda i: '/venues?genre=Jazz', None),
+        ('POST /venues/search', 'POST', lambda i: '/venues/search', lambda i: {'search_term': 'music hop'}),
+        ('GET /venues/<id>', 'GET', lambda i: '/venues/{0}'.format(venue_id(i)), None),
+        ('GET /venues/create', 'GET', lambda i: '/venues/create', None),
+        ('POST /venues/create', 'POST', lambda i: '/venues/create', venue_form),
+        ('GET /venues/<id>/edit', 'GET', lambda i: '/venues/{0}/edit'.format(venue_id(i)), None),
+        ('POST /venues/<id>/edit', 'POST', lambda i: '/venues/{0}/edit'.format(venue_id(i)), venue_form),
+        ('GET /artists', 'GET', lambda i: '/artists', None),
+        ('GET /artists?genre', 'GET', lambda i: '/artists?genre=Jazz', None),
+        ('POST /artists/search', 'POST', lambda i: '/artists/search', lambda i: {'search_term': 'band'}),
+        ('GET /artists/<id>', 'GET', lambda i: '/artists/{0}'.format(artist_id(i)), None),
+        ('GET /artists/create', 'GET', lambda i: '/artists/create', None),
+        ('POST /artists/create', 'POST', lambda i: '/artists/create', artist_form),
+        ('GET /artists/<id>/edit', 'GET', lambda i: '/artists/{0}/edit'.format(artist_id(i)), None),
+        ('POST /artists/<id>/edit', 'POST', lambda i: '/artists/{0}/edit'.format(artist_id(i)), artist_form),
+        ('GET /shows', 'GET', lambda i: '/shows', None),
+        ('GET /shows/create', 'GET', lambda i: '/shows/create', None),
+        ('POST /shows/create', 'POST', lambda i: '/shows/create', lambda i: {
+            'artist_id': artist_id(i), 'venue_id': venue_id(i),
+            'start_time': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')}),
+        ('GET /api/venues', 'GET', lambda i: '/api/venues', None),
+        ('GET /api/artists', 'GET', lambda i: '/api/artists', None),
+        ('GET /api/shows', 'GET', lambda i: '/api/shows' + week, None),
+        ('GET /page-cache/stats', 'GET', lambda i: '/page-cache/stats', None),
+        ('DELETE /venues/<id>', 'DELETE', lambda i: '/venues/{0}'.format(venues - i), None),
+    ]
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of a sorted list.
+    return values[max(int(math.ceil(p / 100.0 * len(values))) - 1, 0)]
+
+
+class QueryCounter:
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def run_route(client, counter, method, url, data, i, traced=False):
+    counter.count = 0
+    if traced:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    response = client.open(url(i), method=method, data=data(i) if data else None)
+    response.get_data()
+    elapsed = time.perf_counter() - start
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1] - baseline if traced else None
+    return elapsed, counter.count, response.status_code, peak
+
+
+def benchmark_size(shows, requests, database_url):
+    venues, artists = sizes_for(shows)
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
+            tempfile.mkdtemp(), 'routes_{0}.db'.format(shows))
+    results = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        seed_catalog(venues, artists, shows)
+        search.create_schema()
+        page_cache.clear()
+        recent.clear()
+        print('{0} shows / {1} venues / {2} artists seeded in {3:.1f}s'.format(
+            shows, venues, artists, time.perf_counter() - started))
+        engine = db.engine
+        route_list = routes(venues, artists)
+        db.session.remove()
+    # Requests run outside the app context above so each one gets its own,
+    # as it would in production.
+    counter = QueryCounter(engine)
+    client = app.test_client()
+    try:
+        for name, method, url, data in route_list:
+            # One warm-up request, then the timed requests, then a few more
+            # under tracemalloc, which slows everything down.
+            run_route(client, counter, method, url, data, 0)
+            timings = []
+            queries = []
+            errors = 0
+            for i in range(1, requests + 1):
+                elapsed, count, status, _ = run_route(client, counter, method, url, data, i)
+                timings.append(elapsed * 1000)
+                queries.append(count)
+                errors += status >= 400
+            tracemalloc.start()
+            try:
+                peaks = [run_route(client, counter, method, url, data, requests + 1 + i, traced=True)[3]
+                         for i in range(MEMORY_SAMPLES)]
+            finally:
+                tracemalloc.stop()
+            timings.sort()
+            queries.sort()
+            results[name] = {
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'queries': queries[-1],
+                'peak_kb': round(max(peaks) / 1024.0, 1),
+                'errors': errors
+            }
+            print('  {0:<26} p50 {p50_ms:8.2f}ms  p95 {p95_ms:8.2f}ms  p99 {p99_ms:8.2f}ms  '
+                  '{queries:4d} queries  {peak_kb:9.1f}kB  {errors} errors'.format(name, **results[name]))
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Returns a list of regression messages.
+    regressions = []
+    for size, routes in results['sizes'].items():
+        for name, current in routes.items():
+            previous = baseline['sizes'].get(size, {}).get(name)
+            if previous is None:
+                continue
+            where = '{0} shows, {1}'.format(size, name)
+            if current['queries'] > previous['queries']:
+                regressions.append('{0}: {1} queries, baseline {2}'.format(where, current['queries'], previous['queries']))
+            if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance) and \
+                    current['p95_ms'] - previous['p95_ms'] > MIN_LATENCY_REGRESSION_MS:
+                regressions.append('{0}: p95 {1:.2f}ms, baseline {2:.2f}ms'.format(where, current['p95_ms'], previous['p95_ms']))
+            if current['peak_kb'] > previous['peak_kb'] * (1 + tolerance):
+                regressions.append('{0}: peak {1:.1f}kB, baseline {2:.1f}kB'.format(where, current['peak_kb'], previous['peak_kb']))
+            if current['errors'] > previous['errors']:
+                regressions.append('{0}: {1} failed requests, baseline {2}'.format(where, current['errors'], previous['errors']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database-url')
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['PAGE_CACHE_STATS'] = True
+    # Count failing routes as errors instead of aborting the run.
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': args.database_url.split(':', 1)[0] if args.database_url else 'sqlite',
+        'requests': args.requests,
+        'sizes': {}
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        results['sizes'][str(size)] = benchmark_size(size, args.requests, args.database_url)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('results written to {0}'.format(args.output))
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            with open(args.baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+            print('no baseline at {0}; saved these results as the baseline'.format(args.baseline))
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print('REGRESSION ' + message)
+        print('{0} regressions against {1}'.format(len(regressions), args.baseline))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
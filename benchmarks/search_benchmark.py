@@ -0,0 +1,78 @@
+"""Search latency benchmark.
+
+Seeds a scratch SQLite database with growing numbers of venues and times the
+original LIKE scan against the FTS5 and in-memory search backends.
+
+    python benchmarks/search_benchmark.py [--sizes 1000,10000,100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Venue
+from search import LikeSearch, SqliteSearch, MemorySearch
+
+app = create_app()
+
+SYLLABLES = ['ka', 'lo', 'mi', 're', 'su', 'ta', 'vo', 'ne', 'ri', 'zu', 'pa', 'do',
+             'gu', 'be', 'fi', 'jo', 'xa', 'we', 'hi', 'co']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Denver', 'CO')]
+TERMS = []
+
+
+def word():
+    return ''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4)))
+
+
+def seed(size):
+    db.drop_all()
+    db.create_all()
+    rows = []
+    for i in range(size):
+        city, state = random.choice(CITIES)
+        name = ' '.join(word() for _ in range(3)).title()
+        rows.append({'name': name, 'city': city, 'state': state, 'address': '1 Main St'})
+    # Search for a word prefix, a full word and a two-word phrase taken from
+    # real names, plus a miss.
+    names = [row['name'].lower().split() for row in random.sample(rows, 3)]
+    TERMS[:] = [names[0][0][:4], names[1][1], ' '.join(names[2][:2]), 'qqq']
+    db.session.bulk_insert_mappings(Venue, rows)
+    db.session.commit()
+
+
+def time_backend(backend, repeat):
+    backend.search('venue', TERMS[0])  # warm up / build in-memory indexes
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for term in TERMS:
+            backend.search('venue', term)
+    return (time.perf_counter() - start) / (repeat * len(TERMS)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'search_benchmark.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    random.seed(0)
+    print('{0:>8} {1:>10} {2:>10} {3:>10}   (ms per search)'.format('venues', 'like', 'fts5', 'memory'))
+    with app.app_context():
+        for size in [int(size) for size in args.sizes.split(',')]:
+            seed(size)
+            SqliteSearch().create_schema()
+            timings = [time_backend(backend(), args.repeat) for backend in (LikeSearch, SqliteSearch, MemorySearch)]
+            print('{0:>8} {1:>10.3f} {2:>10.3f} {3:>10.3f}'.format(size, *timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Cold start benchmark.
+
+Seeds the synthetic catalog (see catalog.py) into a scratch SQLite file,
+then starts fresh Python processes that import the app, create it and
+request each page once through the test client, the way a new worker
+serves its first requests. Reports the median, over --runs processes, of
+the time from process start to each step, once with an empty Jinja
+bytecode cache and once with one filled by `flask warmup`.
+
+    python benchmarks/startup_benchmark.py [--shows 1000] [--runs 5]
+        [--paths /,/venues,/venues/1,/venues/create]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def child(paths):
+    # Runs in the measured process; prints (step, seconds since launch).
+    started = float(os.environ['STARTUP_BENCHMARK_LAUNCHED'])
+    marks = []
+    from app import create_app
+    marks.append(('import', time.time() - started))
+    app = create_app()
+    marks.append(('create_app', time.time() - started))
+    client = app.test_client()
+    for path in paths:
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+        marks.append((path, time.time() - started))
+    start = time.time()
+    client.get(paths[0])
+    marks.append(('{0} again'.format(paths[0]), time.time() - start))
+    print(json.dumps(marks))
+
+
+def launch(paths, env):
+    env = dict(env, STARTUP_BENCHMARK_LAUNCHED=repr(time.time()))
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', '--paths', ','.join(paths)],
+        env=env, cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--paths', default='/,/venues,/venues/1,/venues/create')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    paths = args.paths.split(',')
+    if args.child:
+        return child(paths)
+
+    from app import create_app
+    from catalog import seed_catalog, sizes_for
+    from models import db
+
+    directory = tempfile.mkdtemp()
+    database_url = 'sqlite:///' + os.path.join(directory, 'startup.db')
+    warm_dir = os.path.join(directory, 'jinja-warm')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'JINJA_BYTECODE_CACHE_DIR': warm_dir})
+    with app.app_context():
+        db.create_all()
+        seed_catalog(*sizes_for(args.shows), args.shows)
+        db.session.commit()
+    print(app.test_cli_runner().invoke(args=['warmup']).output.strip())
+
+    env = dict(os.environ, DATABASE_URL=database_url, PAGE_CACHE_BACKEND='lru')
+    for label in ('cold', 'warm'):
+        runs = []
+        for run in range(args.runs):
+            if label == 'cold':
+                cache_dir = os.path.join(directory, 'jinja-cold-{0}'.format(run))
+            else:
+                cache_dir = warm_dir
+            runs.append(launch(paths, dict(env, JINJA_BYTECODE_CACHE_DIR=cache_dir)))
+        print('{0} bytecode cache (median of {1} processes, ms since process start):'.format(label, args.runs))
+        for index, (step, _) in enumerate(runs[0]):
+            print('  {0:24} {1:8.1f}'.format(step, statistics.median(run[index][1] for run in runs) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Typeahead benchmark.
+
+Builds the typeahead prefix index (see typeahead.py) over growing numbers
+of random three-word names and reports the build time, the p50/p99 latency
+of completing 1-4 letter prefixes, and the time to rename an entry
+(remove its keys and insert the new ones), as an edit on the bus does.
+
+    python benchmarks/typeahead_benchmark.py [--sizes 10000,100000,300000] [--lookups 20000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typeahead import PrefixIndex
+
+SYLLABLES = ['ka', 'lo', 'mi', 're', 'su', 'ta', 'vo', 'ne', 'ri', 'zu', 'pa', 'do',
+             'gu', 'be', 'fi', 'jo', 'xa', 'we', 'hi', 'co']
+
+
+def word():
+    return ''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4)))
+
+
+def name():
+    return ' '.join(word() for _ in range(3)).title()
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,300000')
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--updates', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    for size in [int(size) for size in args.sizes.split(',')]:
+        names = [(id, name()) for id in range(1, size + 1)]
+        start = time.perf_counter()
+        index = PrefixIndex(names)
+        built = time.perf_counter() - start
+
+        prefixes = [word()[:random.randint(1, 4)] for _ in range(args.lookups)]
+        samples = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.complete(prefix, 10)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+
+        updates = []
+        for id in random.sample(range(1, size + 1), args.updates):
+            start = time.perf_counter()
+            index.add(id, name())
+            updates.append(time.perf_counter() - start)
+
+        print('{0:>8,} names  build {1:7.2f}s  lookup p50 {2:6.1f}us p99 {3:6.1f}us  '
+              'rename {4:6.2f}ms'.format(
+                  size, built, percentile(samples, 0.5) * 1e6, percentile(samples, 0.99) * 1e6,
+                  statistics.median(updates) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import abort, current_app, g, jsonify
+
+from metrics import PAGE_CACHE
+from recent import BusReader
+from routing import replica_binds
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+# Caches rendered detail-page fragments keyed by (kind, id). Entries are
+# dropped by the write paths through invalidate() and expire on their own
+# after PAGE_CACHE_TTL seconds, or earlier when a view calls expire_at()
+# (e.g. when the next upcoming show starts and moves into the past list).
+#
+# PAGE_CACHE_BACKEND is 'lru' (per process), 'file' (a directory shared by
+# all workers on the host, PAGE_CACHE_DIR) or None to disable caching.
+#
+# With read replicas, invalidate() leaves a marker in place of the entry for
+# DB_READ_AFTER_WRITE_SECONDS: a view rendered from a replica in that time
+# may not have seen the write yet, so it is served but not stored. Views
+# rendered from the primary replace the marker as usual.
+#
+# The 'lru' backend is private to a process, so invalidations are also
+# published on the recently-added bus (see recent.py) and applied by every
+# other process sharing it before its next cached view: a write made in one
+# web worker, or in `flask worker`, reaches all of them.
+#
+# Hits, misses and invalidations are counted in fyyur_page_cache_total on
+# /metrics (see metrics.py), which adds up the workers. /page-cache/stats
+# shows the counts of the process that answers it, and only with
+# PAGE_CACHE_STATS set.
+
+
+class Invalidated:
+    pass
+
+
+class LRUBackend:
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileBackend:
+    # One pickle file per entry. Writes go through a temporary file and
+    # os.replace() so readers in other workers never see a partial entry.
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at <= time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, expires_at):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires_at, value), f)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+
+class PageCache:
+
+    def __init__(self, app=None, recent=None):
+        self.recent = None
+        if app is not None:
+            self.init_app(app, recent)
+
+    def init_app(self, app, recent=None):
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'lru')
+        app.config.setdefault('PAGE_CACHE_SIZE', 1024)
+        app.config.setdefault('PAGE_CACHE_TTL', 300)
+        app.config.setdefault('PAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-page-cache'))
+        app.config.setdefault('PAGE_CACHE_STATS', False)
+
+        # per-app state: the backend (created on first use), this process's
+        # counters and the bus reader
+        app.extensions['page_cache'] = {
+            'stats': {'hit': 0, 'miss': 0, 'invalidation': 0},
+            'stats_lock': threading.Lock(),
+            'reader': BusReader(recent) if recent is not None else None,
+            'lock': threading.Lock(),
+        }
+        if recent is not None:
+            self.recent = recent
+
+        @app.after_request
+        def add_cache_header(response):
+            if 'page_cache' in g:
+                response.headers['X-Page-Cache'] = g.page_cache
+            return response
+
+        app.add_url_rule('/page-cache/stats', 'page_cache_stats', self.show_stats)
+
+    @property
+    def stats(self):
+        state = current_app.extensions['page_cache']
+        with state['stats_lock']:
+            return dict(state['stats'])
+
+    def show_stats(self):
+        if not current_app.config['PAGE_CACHE_STATS']:
+            abort(404)
+        return jsonify(pid=os.getpid(), **self.stats)
+
+    def _count(self, kind, result):
+        PAGE_CACHE.labels(kind, result).inc()
+        state = current_app.extensions['page_cache']
+        with state['stats_lock']:
+            state['stats'][result] += 1
+
+    @property
+    def backend(self):
+        state = current_app.extensions['page_cache']
+        if 'backend' not in state:
+            name = current_app.config['PAGE_CACHE_BACKEND']
+            if name == 'lru':
+                state['backend'] = LRUBackend(current_app.config['PAGE_CACHE_SIZE'])
+            elif name == 'file':
+                state['backend'] = FileBackend(current_app.config['PAGE_CACHE_DIR'])
+            else:
+                state['backend'] = None
+        return state['backend']
+
+    def cached(self, kind):
+        # Caches the fragment returned by `view`; the view's url argument must
+        # be called `<kind>_id`.
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                backend = self.backend
+                if backend is None:
+                    return view(**kwargs)
+                self.sync(backend)
+                key = '{0}:{1}'.format(kind, kwargs[kind + '_id'])
+                value = backend.get(key)
+                if value is not None and not isinstance(value, Invalidated):
+                    self._count(kind, 'hit')
+                    g.page_cache = 'hit'
+                    return value
+                self._count(kind, 'miss')
+                g.page_cache = 'miss'
+                invalidated = isinstance(value, Invalidated)
+                value = view(**kwargs)
+                if value is not None and not (invalidated and g.get('_db_replica')):
+                    expires_at = time.time() + current_app.config['PAGE_CACHE_TTL']
+                    expires_at = min(expires_at, g.get('page_cache_expires_at', expires_at))
+                    backend.set(key, value, expires_at)
+                return value
+            return wrapper
+        return decorator
+
+    def expire_at(self, when):
+        # `when` is a naive local datetime, as stored in Show.start_time.
+        expires_at = time.mktime(when.timetuple())
+        g.page_cache_expires_at = min(expires_at, g.get('page_cache_expires_at', expires_at))
+
+    def invalidate(self, kind, ids):
+        backend = self.backend
+        if backend is None:
+            return
+        self.sync(backend)
+        ids = list(ids)
+        for id in ids:
+            self._drop(backend, kind, id)
+            self._count(kind, 'invalidation')
+        if ids and self.shared_by_bus(backend):
+            self.recent.publish([('invalidate', kind, id, None) for id in ids])
+
+    def _drop(self, backend, kind, id):
+        key = '{0}:{1}'.format(kind, id)
+        lag = current_app.config.get('DB_READ_AFTER_WRITE_SECONDS', 0) if replica_binds(current_app) else 0
+        if lag:
+            backend.set(key, Invalidated(), time.time() + lag)
+        else:
+            backend.delete(key)
+
+    def shared_by_bus(self, backend):
+        return current_app.extensions['page_cache']['reader'] is not None and isinstance(backend, LRUBackend)
+
+    def sync(self, backend):
+        # Applies the invalidations other processes published since the
+        # last call. Starting over (first use, or idle long enough that
+        # events may have been pruned) empties the cache.
+        if not self.shared_by_bus(backend):
+            return
+        state = current_app.extensions['page_cache']
+        with state['lock']:
+            events = state['reader'].read()
+        if events is None:
+            backend.clear()
+            return
+        for event_id, action, kind, id, name in events:
+            if action == 'invalidate':
+                self._drop(backend, kind, id)
+            elif action == 'reload':
+                backend.clear()
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
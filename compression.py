@@ -0,0 +1,113 @@
+import itertools
+import zlib
+
+import brotli
+from flask import current_app, request
+
+#----------------------------------------------------------------------------#
+# Response compression.
+#----------------------------------------------------------------------------#
+# Compresses text responses with brotli or gzip, whichever the client's
+# Accept-Encoding prefers (brotli on a tie). The body is compressed while
+# it is sent, CHUNK_SIZE bytes at a time, so the first bytes leave before
+# the whole page is compressed and streamed responses stay streamed.
+#
+# Bodies under COMPRESS_MIN_SIZE bytes are sent as they are; for a streamed
+# body the first chunks are read ahead to tell. Levels default to
+# COMPRESS_GZIP_LEVEL and COMPRESS_BR_LEVEL and can be set per view with
+# @compression.level(gzip=..., br=...). Responses that already carry a
+# Content-Encoding, such as the precompressed static bundles, and files
+# sent with send_file are left alone.
+
+COMPRESSIBLE = {'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                'application/json', 'application/x-ndjson', 'image/svg+xml'}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _compressor(encoding, level):
+    # (compress, finish) functions of a new compressor.
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def compress_chunks(chunks, encoding, level):
+    # Yields the compressed form of an iterable of byte strings.
+    compress, finish = _compressor(encoding, level)
+    for chunk in chunks:
+        for start in range(0, len(chunk), CHUNK_SIZE):
+            data = compress(chunk[start:start + CHUNK_SIZE])
+            if data:
+                yield data
+    yield finish()
+
+
+class Compression:
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+        app.after_request(self.compress)
+
+    def level(self, gzip=None, br=None):
+        # Sets a view's compression levels: gzip 1-9, brotli 0-11.
+        def decorator(view):
+            view.compress_levels = {encoding: level for encoding, level in (('gzip', gzip), ('br', br))
+                                    if level is not None}
+            return view
+        return decorator
+
+    def compress(self, response):
+        config = current_app.config
+        if not config['COMPRESS_ENABLED'] or request.method == 'HEAD' or \
+                response.direct_passthrough or response.status_code < 200 or \
+                response.status_code in (204, 304) or 'Content-Encoding' in response.headers or \
+                response.mimetype not in COMPRESSIBLE or \
+                'no-transform' in response.headers.get('Cache-Control', ''):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(['br', 'gzip'])
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            original = response.response
+            chunks = response.iter_encoded()
+            head = []
+            size = 0
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size >= config['COMPRESS_MIN_SIZE']:
+                    break
+            else:
+                response.set_data(b''.join(head))
+                return response
+            body = itertools.chain(head, chunks)
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            body = [data]
+
+        view = current_app.view_functions.get(request.endpoint)
+        levels = getattr(view, 'compress_levels', {})
+        level = levels.get(encoding, config['COMPRESS_BR_LEVEL' if encoding == 'br' else 'COMPRESS_GZIP_LEVEL'])
+        response.response = compress_chunks(body, encoding, level)
+        response.headers.pop('Content-Length', None)
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from models import db, Venue, Artist, Show, ShowArchive
+
+#----------------------------------------------------------------------------#
+# Denormalized show counters.
+#----------------------------------------------------------------------------#
+# Venue and Artist carry upcoming_shows_count / past_shows_count so listing
+# pages can read counts without touching the show table. Every helper here
+# only stages UPDATEs on the session; callers commit them together with the
+# write that caused them.
+
+def _bump(model, id, upcoming=0, past=0):
+    db.session.query(model).filter(model.id == id).update({
+        model.upcoming_shows_count: model.upcoming_shows_count + upcoming,
+        model.past_shows_count: model.past_shows_count + past
+    }, synchronize_session=False)
+
+def record_show_created(show, now=None):
+    if now is None:
+        now = datetime.now()
+    show.is_past = show.start_time <= now
+    if show.is_past:
+        change = {'past': 1}
+    else:
+        change = {'upcoming': 1}
+    _bump(Venue, show.venue_id, **change)
+    _bump(Artist, show.artist_id, **change)
+
+def record_venue_shows_deleted(venue_id):
+    # The venue row goes away with its shows, archived ones included, so
+    # only the artists need updating.
+    rows = []
+    for model in (Show, ShowArchive):
+        rows.extend(db.session.query(model.artist_id, model.is_past, db.func.count())
+                    .filter(model.venue_id == venue_id)
+                    .group_by(model.artist_id, model.is_past))
+    for artist_id, is_past, count in rows:
+        if is_past:
+            _bump(Artist, artist_id, past=-count)
+        else:
+            _bump(Artist, artist_id, upcoming=-count)
+
+def _move_to_past(model, column, due):
+    moved = db.session.query(db.func.count(column)) \
+        .filter(column == model.id, due) \
+        .scalar_subquery()
+    db.session.query(model) \
+        .filter(model.id.in_(db.session.query(column).filter(due))) \
+        .update({
+            model.upcoming_shows_count: model.upcoming_shows_count - moved,
+            model.past_shows_count: model.past_shows_count + moved
+        }, synchronize_session=False)
+
+def rollover_shows(now=None):
+    # Moves every show whose start_time has passed from the upcoming to the
+    # past counters with one UPDATE per table. Returns the number of shows moved.
+    if now is None:
+        now = datetime.now()
+    due = (Show.is_past == db.false()) & (Show.start_time <= now)
+    _move_to_past(Venue, Show.venue_id, due)
+    _move_to_past(Artist, Show.artist_id, due)
+    return Show.query.filter(due).update({Show.is_past: True}, synchronize_session=False)
+
+def recompute_show_counters(now=None):
+    # Rebuilds every counter from the show tables, e.g. after manual edits.
+    # Archived shows are always past.
+    if now is None:
+        now = datetime.now()
+    Show.query.update({Show.is_past: Show.start_time <= now}, synchronize_session=False)
+    for model, column, archived in ((Venue, Show.venue_id, ShowArchive.venue_id),
+                                    (Artist, Show.artist_id, ShowArchive.artist_id)):
+        def count(column, *criteria):
+            return db.session.query(db.func.count(column)) \
+                .filter(column == model.id, *criteria) \
+                .scalar_subquery()
+        model.query.update({
+            model.upcoming_shows_count: count(column, Show.is_past == db.false()),
+            model.past_shows_count: count(column, Show.is_past == db.true()) + count(archived)
+        }, synchronize_session=False)
@@ -7,7 +7,11 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python benchmarks/check_query_plans.py && "
+            "python benchmarks/check_query_counts.py && "
+            "python benchmarks/check_read_after_write.py && "
+            "python benchmarks/route_benchmark.py --sizes 1000,10000 --baseline benchmarks/baseline.json",
+            capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -40,7 +44,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python benchmarks/check_query_plans.py"
     )
 
 
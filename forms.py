@@ -1,9 +1,9 @@
 from datetime import datetime
-from lib2to3.pgen2.token import OP
-from secrets import choice
-from flask_wtf import Form
+from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms.widgets import Select, html_params
 from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, StopValidation, Optional
+from markupsafe import Markup
 import re
 from enum import Enum
 
@@ -32,6 +32,52 @@ class Genre(Enum):
     def choices(cls):
         return [(choice.value, choice.value) for choice in cls]
         
+# Built once; the forms share them.
+GENRE_CHOICES = Genre.choices()
+GENRE_NAMES = frozenset(value for value, label in GENRE_CHOICES)
+STATE_CHOICES = [(state, state) for state in (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID',
+    'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM',
+    'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'PA',
+    'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+)]
+
+class CachedSelect(Select):
+    # A field's choices never change, so the <select> markup is built once
+    # per process for each set of render arguments and reused; only the
+    # options selected by the field's data are swapped in per request.
+    def __init__(self, multiple=False):
+        super().__init__(multiple=multiple)
+        self.fragments = {}
+
+    def __call__(self, field, **kwargs):
+        key = (field.id, field.name, tuple(sorted(kwargs.items())))
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            fragment = self.fragments[key] = self.build(field, kwargs)
+        markup, start, options = fragment
+        selected = field.data if self.multiple else [field.data]
+        if not selected or selected == [None]:
+            return markup
+        selected = set(selected)
+        return Markup(start + ''.join(
+            selected_html if value in selected else html for value, html, selected_html in options
+        ) + '</select>')
+
+    def build(self, field, kwargs):
+        # (markup with nothing selected, opening tag,
+        #  [(coerced value, option, selected option)])
+        kwargs.setdefault('id', field.id)
+        if self.multiple:
+            kwargs['multiple'] = True
+        if 'required' not in kwargs and field.flags.required:
+            kwargs['required'] = True
+        start = '<select %s>' % html_params(name=field.name, **kwargs)
+        options = [(field.coerce(value), self.render_option(value, label, False), self.render_option(value, label, True))
+                   for value, label in field.choices]
+        markup = Markup(start + ''.join(html for value, html, selected_html in options) + '</select>')
+        return markup, start, options
+
 def validate_phone(form, field):    
     us_phone_num = '^([0-9]{3})[-][0-9]{3}[-][0-9]{4}$'
     match = re.search(us_phone_num, field.data)
@@ -44,7 +90,7 @@ def validate_facebook_link(form, field):
     if not match:
         raise ValidationError('Error, check the link and try again')
 
-class ShowForm(Form):
+class ShowForm(FlaskForm):
     artist_id = StringField(
         'artist_id'
     )
@@ -57,21 +103,11 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
-class VenueForm(Form):
-    def validate(self):                                                         
-        rv = Form.validate(self)                                                
-        if not rv:                                                              
+class VenueForm(FlaskForm):
+    def validate(self):
+        if not FlaskForm.validate(self):
             return False
-        selected_genres = self.genres.data
-        all_genres = list(dict(Genre.choices()).keys())
-        for i in range(len(selected_genres)):
-            for j in range(len(all_genres)):
-                if selected_genres[i] == all_genres[j]:
-                    break
-                if j == len(all_genres) - 1:
-                    return False                                                                  
-
-        return True
+        return GENRE_NAMES.issuperset(self.genres.data)
     
     name = StringField(
         'name', validators=[DataRequired()]
@@ -81,59 +117,7 @@ class VenueForm(Form):
     )
     state = SelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        choices=STATE_CHOICES, widget=CachedSelect()
     )
     address = StringField(
         'address', validators=[DataRequired()]
@@ -146,7 +130,7 @@ class VenueForm(Form):
     )
     genres = SelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=Genre.choices()
+        choices=GENRE_CHOICES, widget=CachedSelect(multiple=True)
     )
     facebook_link = StringField(
         'facebook_link', validators=[URL(), Optional()]
@@ -162,7 +146,7 @@ class VenueForm(Form):
     )
 
 
-class ArtistForm(Form):
+class ArtistForm(FlaskForm):
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -171,59 +155,7 @@ class ArtistForm(Form):
     )
     state = SelectField(
         'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        choices=STATE_CHOICES, widget=CachedSelect()
     )
     phone = StringField(
         'phone', validators=[DataRequired(), validate_phone]
@@ -233,27 +165,7 @@ class ArtistForm(Form):
     )
     genres = SelectMultipleField(
         'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        choices=GENRE_CHOICES, widget=CachedSelect(multiple=True)
      )
     facebook_link = StringField(
         'facebook_link', validators=[URL(), validate_facebook_link, Optional()]
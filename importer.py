@@ -0,0 +1,251 @@
+import csv
+import io
+import json
+import os
+import time
+
+from werkzeug.datastructures import MultiDict
+
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, VenueGenre, ArtistGenre
+
+#----------------------------------------------------------------------------#
+# Bulk catalog import.
+#----------------------------------------------------------------------------#
+# Reads venues, artists and shows from CSV or NDJSON files (picked by file
+# extension), validates every row with the same form classes the create
+# pages use and inserts the valid rows in batches: COPY on PostgreSQL,
+# executemany everywhere else.
+#
+# Ids are allocated in memory, so foreign keys never need a lookup query:
+# the optional `id` column of the venue/artist files is a source key that
+# the show file's `venue_id`/`artist_id` refer to. When a run imports no
+# venues (or artists), show rows refer to existing database ids instead.
+# Must run inside a request context, which the forms need; the caller
+# commits.
+
+DEFAULT_BATCH_SIZE = 5000
+
+MAX_REPORTED_ERRORS = 20
+
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'on')
+
+# Text inputs a browser always submits, if only as empty strings.
+TEXT_FIELDS = ('name', 'city', 'state', 'address', 'phone', 'image_link',
+               'facebook_link', 'website_link', 'seeking_description')
+
+
+def read_rows(path):
+    # Yields (line number, row dict) pairs.
+    if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl'):
+        with open(path) as f:
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    yield line, json.loads(text)
+    else:
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def _formdata(row):
+    data = MultiDict((field, '') for field in TEXT_FIELDS if row.get(field) is None)
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = [genre.strip() for genre in value.split(',') if genre.strip()]
+            for genre in value:
+                data.add(key, genre)
+        elif isinstance(value, bool):
+            if value:
+                data.add(key, 'y')
+        elif key in ('seeking_talent', 'seeking_venue'):
+            if str(value).strip().lower() in TRUE_VALUES:
+                data.add(key, 'y')
+        else:
+            data.add(key, str(value))
+    return data
+
+
+def _form_errors(form):
+    if form.errors:
+        return '; '.join('{0}: {1}'.format(field, ', '.join(messages)) for field, messages in form.errors.items())
+    return 'invalid value'
+
+
+class CatalogImporter:
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, echo=print):
+        self.batch_size = batch_size
+        self.echo = echo
+        self.venue_ids = {}
+        self.artist_ids = {}
+        self.errors = []
+
+    @property
+    def dialect(self):
+        return db.engine.dialect.name
+
+    def _next_id(self, model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+    def _lock(self, model):
+        if self.dialect == 'postgresql':
+            db.session.execute(db.text('LOCK TABLE {0} IN EXCLUSIVE MODE'.format(model.__tablename__)))
+
+    def _error(self, path, line, message):
+        self.errors.append((path, line, message))
+        if len(self.errors) <= MAX_REPORTED_ERRORS:
+            self.echo('{0}:{1}: {2}'.format(path, line, message))
+
+    def _insert(self, model, rows, genre_model=None):
+        # Rows of genre_model-backed entities carry a 'genres' list, which is
+        # inserted into the association table after the entity rows.
+        if not rows:
+            return
+        if genre_model is not None:
+            key = model.__tablename__ + '_id'
+            genre_rows = [{key: row['id'], 'genre': genre} for row in rows for genre in row['genres']]
+            rows = [{column: value for column, value in row.items() if column != 'genres'} for row in rows]
+            self._insert(model, rows)
+            self._insert(genre_model, genre_rows)
+            return
+        if self.dialect == 'postgresql':
+            # COPY is several times faster than even a batched INSERT.
+            columns = list(rows[0])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+            buffer.seek(0)
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert(
+                "COPY {0} ({1}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(model.__tablename__, ', '.join(columns)),
+                buffer
+            )
+        else:
+            db.session.execute(model.__table__.insert(), rows)
+
+    def _load(self, path, model, to_row, genre_model=None):
+        started = time.perf_counter()
+        batch = []
+        count = 0
+        for line, raw in read_rows(path):
+            row = to_row(path, line, raw)
+            if row is None:
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._insert(model, batch, genre_model)
+                count += len(batch)
+                batch = []
+        self._insert(model, batch, genre_model)
+        count += len(batch)
+        elapsed = time.perf_counter() - started
+        self.echo('{0}: {1} rows in {2:.1f}s ({3:.0f} rows/s)'.format(
+            model.__tablename__, count, elapsed, count / elapsed if elapsed else 0))
+        return count
+
+    def import_venues(self, path):
+        self._lock(Venue)
+        next_id = [self._next_id(Venue)]
+
+        def to_row(path, line, raw):
+            form = VenueForm(formdata=_formdata(raw), meta={'csrf': False})
+            if not form.validate():
+                self._error(path, line, _form_errors(form))
+                return None
+            id = next_id[0]
+            next_id[0] += 1
+            if raw.get('id') is not None:
+                self.venue_ids[str(raw['id'])] = id
+            return {
+                'id': id,
+                'name': form.name.data,
+                'city': form.city.data,
+                'state': form.state.data,
+                'address': form.address.data,
+                'phone': form.phone.data,
+                'genres': sorted(set(form.genres.data)),
+                'facebook_link': form.facebook_link.data,
+                'image_link': form.image_link.data,
+                'website': form.website_link.data,
+                'seeking_talent': form.seeking_talent.data,
+                'seeking_description': form.seeking_description.data,
+                'upcoming_shows_count': 0,
+                'past_shows_count': 0
+            }
+
+        return self._load(path, Venue, to_row, VenueGenre)
+
+    def import_artists(self, path):
+        self._lock(Artist)
+        next_id = [self._next_id(Artist)]
+
+        def to_row(path, line, raw):
+            form = ArtistForm(formdata=_formdata(raw), meta={'csrf': False})
+            if not form.validate():
+                self._error(path, line, _form_errors(form))
+                return None
+            id = next_id[0]
+            next_id[0] += 1
+            if raw.get('id') is not None:
+                self.artist_ids[str(raw['id'])] = id
+            return {
+                'id': id,
+                'name': form.name.data,
+                'city': form.city.data,
+                'state': form.state.data,
+                'phone': form.phone.data,
+                'genres': sorted(set(form.genres.data)),
+                'facebook_link': form.facebook_link.data,
+                'image_link': form.image_link.data,
+                'website': form.website_link.data,
+                'seeking_venue': form.seeking_venue.data,
+                'seeking_description': form.seeking_description.data,
+                'upcoming_shows_count': 0,
+                'past_shows_count': 0
+            }
+
+        return self._load(path, Artist, to_row, ArtistGenre)
+
+    def _id_resolver(self, model, imported_ids):
+        if imported_ids:
+            return imported_ids
+        return {str(id): id for id, in db.session.query(model.id)}
+
+    def import_shows(self, path):
+        venue_ids = self._id_resolver(Venue, self.venue_ids)
+        artist_ids = self._id_resolver(Artist, self.artist_ids)
+
+        def to_row(path, line, raw):
+            form = ShowForm(formdata=_formdata(raw), meta={'csrf': False})
+            if not form.validate():
+                self._error(path, line, _form_errors(form))
+                return None
+            venue_id = venue_ids.get(str(form.venue_id.data))
+            artist_id = artist_ids.get(str(form.artist_id.data))
+            if venue_id is None or artist_id is None:
+                self._error(path, line, 'unknown venue_id or artist_id')
+                return None
+            return {
+                'artist_id': artist_id,
+                'venue_id': venue_id,
+                'start_time': form.start_time.data,
+                'is_past': False
+            }
+
+        return self._load(path, Show, to_row)
+
+    def finish(self):
+        if self.dialect == 'postgresql':
+            # Explicit ids bypass the sequences; move them past the new rows.
+            for table in ('venue', 'artist'):
+                db.session.execute(db.text(
+                    "SELECT setval(pg_get_serial_sequence('{0}', 'id'), coalesce(max(id), 1)) FROM {0}".format(table)
+                ))
+        if self.errors:
+            self.echo('{0} rows rejected'.format(len(self.errors)))
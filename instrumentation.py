@@ -0,0 +1,125 @@
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Per-request SQL instrumentation.
+#----------------------------------------------------------------------------#
+# Counts the statements each request runs and the time spent in the
+# database, reported in a Server-Timing header:
+#
+#   Server-Timing: db;dur=4.2;desc="6 queries", app;dur=11.8
+#
+# Statements are grouped by shape (whitespace and IN (...) lists collapsed);
+# a shape run SQL_N_PLUS_ONE_THRESHOLD times or more in one request is
+# logged as an N+1 suspect together with the view. Views can declare a
+# query budget with @query_stats.budget(n) (SQL_QUERY_BUDGET applies to the
+# others); going over it is logged, or raises QueryBudgetExceeded when
+# SQL_QUERY_BUDGET_STRICT is set, which defaults to app.testing.
+#
+# Statements a streamed response runs after the view has returned are not
+# counted.
+
+WHITESPACE = re.compile(r'\s+')
+IN_LIST = re.compile(r'\bIN \((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def statement_shape(statement):
+    return IN_LIST.sub('IN (...)', WHITESPACE.sub(' ', statement).strip())
+
+
+class RequestQueries:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+
+def _current():
+    if has_app_context():
+        return g.get('_query_stats')
+    return None
+
+
+# The start time is kept on the statement's execution context rather than
+# the connection: a statement that raises never reaches after_cursor_execute,
+# and its context is thrown away with it.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current() is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current()
+    started = getattr(context, '_query_started', None)
+    if stats is None or started is None:
+        return
+    del context._query_started
+    stats.duration += time.perf_counter() - started
+    stats.count += 1
+    stats.shapes[statement_shape(statement)] += 1
+
+
+class QueryStats:
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_STATS_ENABLED', True)
+        app.config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('SQL_QUERY_BUDGET', None)
+        app.config.setdefault('SQL_QUERY_BUDGET_STRICT', None)
+
+        @app.before_request
+        def start_query_stats():
+            if current_app.config['SQL_STATS_ENABLED']:
+                g._query_stats = RequestQueries()
+
+        @app.after_request
+        def report_query_stats(response):
+            stats = g.pop('_query_stats', None)
+            if stats is None:
+                return response
+            elapsed = time.perf_counter() - stats.started
+            response.headers.add('Server-Timing', 'db;dur={0:.1f};desc="{1} queries", app;dur={2:.1f}'.format(
+                stats.duration * 1000, stats.count, elapsed * 1000))
+            self.check(stats)
+            return response
+
+    def budget(self, queries):
+        # Declares the most statements a view may run per request.
+        def decorator(view):
+            view.query_budget = queries
+            return view
+        return decorator
+
+    def check(self, stats):
+        config = current_app.config
+        view = request.endpoint or request.path
+        for shape, count in stats.shapes.items():
+            if count >= config['SQL_N_PLUS_ONE_THRESHOLD']:
+                current_app.logger.warning('Possible N+1 in %s: %d x %s', view, count, shape)
+
+        function = current_app.view_functions.get(request.endpoint)
+        budget = getattr(function, 'query_budget', config['SQL_QUERY_BUDGET'])
+        if budget is None or stats.count <= budget:
+            return
+        message = '{0} ran {1} queries, over its budget of {2}'.format(view, stats.count, budget)
+        strict = config['SQL_QUERY_BUDGET_STRICT']
+        if strict or (strict is None and current_app.testing):
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
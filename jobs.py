@@ -0,0 +1,242 @@
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Job
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+# Slow work (deleting a venue with its shows, rebuilding the counters,
+# archiving, compiling templates) runs outside the request that asked for
+# it. The request stores a row in the job table with jobs.enqueue() and
+# commits it together with its own writes; `flask worker` claims due jobs
+# and runs them on JOB_WORKER_THREADS threads, each in its own app context
+# and session. /api/jobs/<id> reports where a job is.
+#
+# A job that raises is retried JOB_MAX_ATTEMPTS times in all, after
+# JOB_RETRY_DELAY seconds, then twice that and so on, up to
+# JOB_RETRY_MAX_DELAY; after the last attempt it stays 'failed' with the
+# traceback in `error`. While a job runs, its worker refreshes the job's
+# heartbeat_at every HEARTBEAT_INTERVAL seconds, however long the job
+# takes; a running job whose heartbeat is older than JOB_TIMEOUT seconds
+# belongs to a worker that died and is retried the same way.
+#
+# Several workers can share the table: on PostgreSQL due rows are selected
+# FOR UPDATE SKIP LOCKED, elsewhere a row goes to whichever worker's
+# conditional UPDATE changes it first. JOB_SCHEDULE maps task names to
+# intervals in seconds; the workers enqueue each of those once per interval
+# (the job's unique key names the interval, so only one worker does).
+# Finished jobs are deleted after JOB_RETENTION_DAYS.
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Seconds between the worker's heartbeats and its checks for stale jobs
+# and for old ones.
+HEARTBEAT_INTERVAL = 30
+STALE_CHECK_INTERVAL = 60
+PRUNE_INTERVAL = 3600
+
+
+class JobQueue:
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_WORKER_THREADS', 4)
+        app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOB_RETRY_DELAY', 10)
+        app.config.setdefault('JOB_RETRY_MAX_DELAY', 3600)
+        app.config.setdefault('JOB_TIMEOUT', 300)
+        app.config.setdefault('JOB_RETENTION_DAYS', 7)
+        app.config.setdefault('JOB_SCHEDULE', {})
+        # per app: the schedule slot each task was last enqueued for
+        app.extensions['jobs'] = {'scheduled': {}}
+
+    def task(self, name):
+        # Registers a function as the task `name`; it gets the job's
+        # arguments as keyword arguments and commits its own writes. What
+        # it returns is stored, as JSON, in the job's result.
+        def decorator(function):
+            self.tasks[name] = function
+            return function
+        return decorator
+
+    def enqueue(self, name, run_at=None, max_attempts=None, key=None, **args):
+        # Adds a job to the session, to run at `run_at` (now by default),
+        # and flushes it for its id. The caller commits.
+        if name not in self.tasks:
+            raise ValueError('Unknown task {0!r}'.format(name))
+        if max_attempts is None:
+            max_attempts = current_app.config['JOB_MAX_ATTEMPTS']
+        job = Job(name=name, args=args, key=key, state=QUEUED, attempts=0, max_attempts=max_attempts,
+                  run_at=run_at or datetime.now(), created_at=datetime.now())
+        db.session.add(job)
+        db.session.flush()
+        return job
+
+    # Worker.
+
+    def schedule(self, now=None):
+        # Enqueues the JOB_SCHEDULE tasks whose interval started since
+        # their last job.
+        now = now or datetime.now()
+        scheduled = current_app.extensions['jobs']['scheduled']
+        for name, interval in current_app.config['JOB_SCHEDULE'].items():
+            slot = int(now.timestamp() // interval)
+            if scheduled.get(name) == slot:
+                continue
+            key = '{0}@{1}'.format(name, slot * interval)
+            if not db.session.query(Job.query.filter(Job.key == key).exists()).scalar():
+                try:
+                    self.enqueue(name, run_at=now, key=key)
+                    db.session.commit()
+                except IntegrityError:
+                    # another worker got there first
+                    db.session.rollback()
+            scheduled[name] = slot
+
+    def heartbeat(self, worker, now=None):
+        # Marks the jobs `worker` is running as still alive.
+        Job.query.filter(Job.state == RUNNING, Job.locked_by == worker) \
+            .update({Job.heartbeat_at: now or datetime.now()}, synchronize_session=False)
+        db.session.commit()
+
+    def requeue_stale(self, now=None):
+        now = now or datetime.now()
+        timeout = current_app.config['JOB_TIMEOUT']
+        # started_at for jobs claimed before workers sent heartbeats
+        last_seen = db.func.coalesce(Job.heartbeat_at, Job.started_at)
+        stale = Job.query.filter(Job.state == RUNNING, last_seen < now - timedelta(seconds=timeout)).all()
+        for job in stale:
+            self._failed(job, 'No heartbeat from {0} for {1}s; the worker may have died'.format(
+                job.locked_by, timeout), now)
+        db.session.commit()
+        return len(stale)
+
+    def prune(self, now=None):
+        now = now or datetime.now()
+        horizon = now - timedelta(days=current_app.config['JOB_RETENTION_DAYS'])
+        deleted = Job.query.filter(Job.state == DONE, Job.finished_at < horizon).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def claim(self, limit, worker, now=None):
+        # Marks up to `limit` due jobs as running for `worker` and returns
+        # their ids.
+        now = now or datetime.now()
+        ids = [row.id for row in db.session.query(Job.id)
+               .filter(Job.state == QUEUED, Job.run_at <= now)
+               .order_by(Job.run_at, Job.id)
+               .limit(limit)
+               .with_for_update(skip_locked=True)]
+        claimed = []
+        for id in ids:
+            updated = Job.query.filter(Job.id == id, Job.state == QUEUED).update({
+                Job.state: RUNNING,
+                Job.attempts: Job.attempts + 1,
+                Job.started_at: now,
+                Job.heartbeat_at: now,
+                Job.locked_by: worker,
+            }, synchronize_session=False)
+            if updated:
+                claimed.append(id)
+        db.session.commit()
+        return claimed
+
+    def _failed(self, job, error, now):
+        job.error = error
+        job.locked_by = None
+        if job.attempts < job.max_attempts:
+            config = current_app.config
+            delay = min(config['JOB_RETRY_DELAY'] * 2 ** max(job.attempts - 1, 0), config['JOB_RETRY_MAX_DELAY'])
+            job.state = QUEUED
+            job.run_at = now + timedelta(seconds=delay)
+        else:
+            job.state = FAILED
+            job.finished_at = now
+
+    def run(self, id):
+        # Runs one claimed job and records how it went.
+        job = db.session.get(Job, id)
+        name, args = job.name, dict(job.args)
+        try:
+            task = self.tasks.get(name)
+            if task is None:
+                raise LookupError('Unknown task {0!r}'.format(name))
+            result = task(**args)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc()
+            current_app.logger.warning('Job %s (%s) failed:\n%s', id, name, error)
+            self._failed(db.session.get(Job, id), error, datetime.now())
+        else:
+            job = db.session.get(Job, id)
+            job.state = DONE
+            job.result = result
+            job.error = None
+            job.locked_by = None
+            job.finished_at = datetime.now()
+        db.session.commit()
+
+    def work(self, threads=None, once=False, echo=print):
+        # Runs due jobs until interrupted; with `once`, until none are due.
+        app = current_app._get_current_object()
+        config = app.config
+        threads = threads or config['JOB_WORKER_THREADS']
+        worker = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        echo('Worker {0} running {1} threads'.format(worker, threads))
+
+        def run_in_context(id):
+            with app.app_context():
+                try:
+                    self.run(id)
+                finally:
+                    db.session.remove()
+
+        running = set()
+        beaten = time.monotonic()
+        checked = pruned = None
+        with ThreadPoolExecutor(threads) as pool:
+            try:
+                while True:
+                    if not once:
+                        self.schedule()
+                    if running and time.monotonic() - beaten > HEARTBEAT_INTERVAL:
+                        self.heartbeat(worker)
+                        beaten = time.monotonic()
+                    if checked is None or time.monotonic() - checked > STALE_CHECK_INTERVAL:
+                        self.requeue_stale()
+                        checked = time.monotonic()
+                    if pruned is None or time.monotonic() - pruned > PRUNE_INTERVAL:
+                        self.prune()
+                        pruned = time.monotonic()
+                    running = {future for future in running if not future.done()}
+                    ids = self.claim(threads - len(running), worker) if len(running) < threads else []
+                    for id in ids:
+                        running.add(pool.submit(run_in_context, id))
+                    if once and not ids and not running:
+                        break
+                    if not ids:
+                        if running:
+                            wait(running, timeout=config['JOB_POLL_INTERVAL'], return_when=FIRST_COMPLETED)
+                        else:
+                            time.sleep(config['JOB_POLL_INTERVAL'])
+            except KeyboardInterrupt:
+                echo('Stopping: waiting for {0} running jobs'.format(len(running)))
+            finally:
+                db.session.remove()
@@ -0,0 +1,79 @@
+from flask import g
+
+from models import Venue, Artist
+
+# Keep IN (...) lists well under the bound-parameter limits of the drivers.
+BATCH_SIZE = 500
+
+#----------------------------------------------------------------------------#
+# Batch loader.
+#----------------------------------------------------------------------------#
+
+class BatchLoader:
+    # Collects the keys a request needs, resolves them with one batch call
+    # and memoizes the results for the rest of the request.
+
+    def __init__(self, batch_fn):
+        self.batch_fn = batch_fn
+        self._cache = {}
+        self._queue = []
+        self._queued = set()
+
+    def prime(self, keys):
+        for key in keys:
+            if key is None or key in self._cache or key in self._queued:
+                continue
+            self._queue.append(key)
+            self._queued.add(key)
+
+    def dispatch(self):
+        while self._queue:
+            keys = self._queue[:BATCH_SIZE]
+            del self._queue[:BATCH_SIZE]
+            results = self.batch_fn(keys)
+            for key in keys:
+                self._cache[key] = results.get(key)
+                self._queued.discard(key)
+
+    def load(self, key):
+        if key not in self._cache:
+            self.prime([key])
+            self.dispatch()
+        return self._cache.get(key)
+
+    def load_many(self, keys):
+        keys = list(keys)
+        self.prime(keys)
+        self.dispatch()
+        return [self._cache.get(key) for key in keys]
+
+    def put(self, key, value):
+        self._cache[key] = value
+
+    def clear(self, key=None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+#----------------------------------------------------------------------------#
+# Batch functions.
+#----------------------------------------------------------------------------#
+
+def load_entities(model):
+    def batch_fn(ids):
+        entities = model.query.filter(model.id.in_(ids)).all()
+        return {entity.id: entity for entity in entities}
+    return batch_fn
+
+LOADERS = {
+    'artist': load_entities(Artist),
+    'venue': load_entities(Venue),
+}
+
+def get_loader(name):
+    # Loaders live on `g`, so their memoized results never outlive the request.
+    loaders = g.setdefault('_loaders', {})
+    if name not in loaders:
+        loaders[name] = BatchLoader(LOADERS[name])
+    return loaders[name]
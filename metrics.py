@@ -0,0 +1,147 @@
+import os
+import time
+
+from flask import Response, current_app, g, request, before_render_template, template_rendered
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+from sqlalchemy import event
+
+from routing import replica_binds
+
+#----------------------------------------------------------------------------#
+# Prometheus metrics.
+#----------------------------------------------------------------------------#
+# /metrics serves, in the Prometheus text format:
+#
+#   fyyur_request_duration_seconds    histogram by endpoint, method, status
+#   fyyur_requests_in_flight          gauge by endpoint
+#   fyyur_db_pool_checked_out         gauge by database (connections in use)
+#   fyyur_db_pool_overflow            gauge by database (connections past pool_size)
+#   fyyur_template_render_seconds     histogram by template
+#   fyyur_page_cache_total            counter by kind, result (hit, miss, invalidation)
+#
+# With several worker processes (gunicorn), export PROMETHEUS_MULTIPROC_DIR
+# pointing at an empty directory before the workers start: every process
+# then writes its samples to memory-mapped files there and /metrics, served
+# by any worker, sums them. Wipe the directory on each deploy and call
+# mark_process_dead(pid) from gunicorn's child_exit hook so the gauges of
+# exited workers are dropped. Without the variable the metrics are those of
+# the current process.
+#
+# Request durations cover the view; streamed bodies are sent afterwards.
+
+REQUEST_DURATION = Histogram(
+    'fyyur_request_duration_seconds', 'Time spent handling a request.',
+    ['endpoint', 'method', 'status'],
+    buckets=(.005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    'fyyur_requests_in_flight', 'Requests currently being handled.',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+
+POOL_CHECKED_OUT = Gauge(
+    'fyyur_db_pool_checked_out', 'Database connections checked out of the pool.',
+    ['database'], multiprocess_mode='livesum'
+)
+
+POOL_OVERFLOW = Gauge(
+    'fyyur_db_pool_overflow', 'Database connections opened beyond the pool size.',
+    ['database'], multiprocess_mode='livesum'
+)
+
+TEMPLATE_RENDER_DURATION = Histogram(
+    'fyyur_template_render_seconds', 'Time spent rendering a template.',
+    ['template'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+)
+
+PAGE_CACHE = Counter(
+    'fyyur_page_cache', 'Page cache lookups and invalidations.',
+    ['kind', 'result']
+)
+
+
+def mark_process_dead(pid):
+    # For gunicorn's child_exit hook.
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _update_pool(name, pool):
+    # Only QueuePool counts checkouts and overflow; other pools report 0.
+    checked_out = getattr(pool, 'checkedout', None)
+    overflow = getattr(pool, 'overflow', None)
+    POOL_CHECKED_OUT.labels(name).set(checked_out() if checked_out else 0)
+    POOL_OVERFLOW.labels(name).set(max(overflow(), 0) if overflow else 0)
+
+
+class Metrics:
+
+    def __init__(self, app=None, db=None):
+        self.pools = set()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+
+        @app.before_request
+        def start_request_metrics():
+            self.watch_pools()
+            g._metrics_endpoint = _endpoint()
+            g._metrics_started = time.perf_counter()
+            REQUESTS_IN_FLIGHT.labels(g._metrics_endpoint).inc()
+
+        @app.after_request
+        def observe_request(response):
+            if '_metrics_started' in g:
+                REQUEST_DURATION.labels(g._metrics_endpoint, request.method, response.status_code) \
+                    .observe(time.perf_counter() - g._metrics_started)
+            return response
+
+        @app.teardown_request
+        def finish_request_metrics(error=None):
+            endpoint = g.pop('_metrics_endpoint', None)
+            if endpoint is not None:
+                REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+
+        before_render_template.connect(self._start_render, app)
+        template_rendered.connect(self._observe_render, app)
+
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+
+    def watch_pools(self):
+        # Engines are created lazily, so pools are hooked on first sight.
+        engines = {'default': self.db.engine}
+        for bind in replica_binds(current_app):
+            engines[bind] = self.db.get_engine(current_app, bind=bind)
+        for name, engine in engines.items():
+            pool = engine.pool
+            if pool in self.pools:
+                continue
+            self.pools.add(pool)
+            for event_name in ('checkout', 'checkin'):
+                event.listen(pool, event_name, lambda *args, name=name, pool=pool: _update_pool(name, pool))
+            _update_pool(name, pool)
+
+    def _start_render(self, app, template, context):
+        g.setdefault('_render_started', []).append(time.perf_counter())
+
+    def _observe_render(self, app, template, context):
+        started = g.get('_render_started')
+        if started:
+            TEMPLATE_RENDER_DURATION.labels(template.name or 'string').observe(time.perf_counter() - started.pop())
+
+    def expose(self):
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,46 @@
+"""denormalized upcoming/past show counters
+
+Revision ID: 3f1c9a7e52b4
+Revises: 777ad92cd165
+Create Date: 2022-09-02 10:14:31.512803
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7e52b4'
+down_revision = '777ad92cd165'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('show', sa.Column('is_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill the counters from the existing shows.
+    now = datetime.now()
+    op.get_bind().execute(
+        sa.text('UPDATE show SET is_past = (start_time <= :now)'), {'now': now}
+    )
+    for table in ('venue', 'artist'):
+        op.execute(
+            'UPDATE {0} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM show WHERE show.{0}_id = {0}.id AND NOT show.is_past), '
+            'past_shows_count = (SELECT count(*) FROM show WHERE show.{0}_id = {0}.id AND show.is_past)'.format(table)
+        )
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.drop_column('is_past')
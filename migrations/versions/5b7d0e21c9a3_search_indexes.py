@@ -0,0 +1,62 @@
+"""full-text search indexes for venues and artists
+
+Revision ID: 5b7d0e21c9a3
+Revises: 3f1c9a7e52b4
+Create Date: 2022-09-09 16:42:05.118260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d0e21c9a3'
+down_revision = '3f1c9a7e52b4'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist')
+
+# Must stay identical to PostgresSearch.VECTOR in search.py.
+VECTOR = "to_tsvector('simple', name || ' ' || city || ' ' || state)"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in TABLES:
+            op.execute('CREATE INDEX ix_{0}_search_vector ON {0} USING gin ({1})'.format(table, VECTOR))
+            op.execute('CREATE INDEX ix_{0}_name_trgm ON {0} USING gin (lower(name) gin_trgm_ops)'.format(table))
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            op.execute(
+                "CREATE VIRTUAL TABLE {0}_fts USING fts5(name, city, state, content='{0}', content_rowid='id')".format(table)
+            )
+            op.execute(
+                'CREATE TRIGGER {0}_fts_ai AFTER INSERT ON {0} BEGIN '
+                'INSERT INTO {0}_fts(rowid, name, city, state) VALUES (new.id, new.name, new.city, new.state); END'.format(table)
+            )
+            op.execute(
+                'CREATE TRIGGER {0}_fts_ad AFTER DELETE ON {0} BEGIN '
+                "INSERT INTO {0}_fts({0}_fts, rowid, name, city, state) VALUES ('delete', old.id, old.name, old.city, old.state); END".format(table)
+            )
+            op.execute(
+                'CREATE TRIGGER {0}_fts_au AFTER UPDATE OF name, city, state ON {0} BEGIN '
+                "INSERT INTO {0}_fts({0}_fts, rowid, name, city, state) VALUES ('delete', old.id, old.name, old.city, old.state); "
+                'INSERT INTO {0}_fts(rowid, name, city, state) VALUES (new.id, new.name, new.city, new.state); END'.format(table)
+            )
+            op.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute('DROP INDEX ix_{0}_name_trgm'.format(table))
+            op.execute('DROP INDEX ix_{0}_search_vector'.format(table))
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for trigger in ('au', 'ad', 'ai'):
+                op.execute('DROP TRIGGER {0}_fts_{1}'.format(table, trigger))
+            op.execute('DROP TABLE {0}_fts'.format(table))
@@ -0,0 +1,83 @@
+"""normalize genres into venue_genre/artist_genre tables
+
+Revision ID: 8e4a6c2d1f70
+Revises: 5b7d0e21c9a3
+Create Date: 2022-09-16 11:27:48.904515
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4a6c2d1f70'
+down_revision = '5b7d0e21c9a3'
+branch_labels = None
+depends_on = None
+
+# Genre values as of this revision (forms.Genre).
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+          'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Other')
+
+genre_enum = sa.Enum(*GENRES, name='genre')
+genre_type = genre_enum.with_variant(postgresql.ENUM(*GENRES, name='genre', create_type=False), 'postgresql')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        genre_enum.create(bind, checkfirst=True)
+
+    for table in ('venue', 'artist'):
+        genre_table = op.create_table('{0}_genre'.format(table),
+        sa.Column('{0}_id'.format(table), sa.Integer(), nullable=False),
+        sa.Column('genre', genre_type, nullable=False),
+        sa.ForeignKeyConstraint(['{0}_id'.format(table)], ['{0}.id'.format(table)], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('{0}_id'.format(table), 'genre')
+        )
+        op.create_index('ix_{0}_genre_genre_{0}_id'.format(table), '{0}_genre'.format(table), ['genre', '{0}_id'.format(table)])
+
+        # Move the comma-joined strings into the new table, dropping values
+        # that were never valid genres.
+        rows = bind.execute(sa.text('SELECT id, genres FROM {0} WHERE genres IS NOT NULL'.format(table)))
+        genre_rows = []
+        for id, genres in rows:
+            for genre in sorted(set(genre.strip() for genre in genres.split(','))):
+                if genre in GENRES:
+                    genre_rows.append({'{0}_id'.format(table): id, 'genre': genre})
+        if genre_rows:
+            op.bulk_insert(genre_table, genre_rows)
+
+        if bind.dialect.name == 'sqlite':
+            # A native DROP COLUMN keeps the FTS triggers on the table, which
+            # a batch-mode table rebuild would silently drop.
+            op.execute('ALTER TABLE {0} DROP COLUMN genres'.format(table))
+        else:
+            op.drop_column(table, 'genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, nullable in (('venue', True), ('artist', False)):
+        op.add_column(table, sa.Column('genres', sa.String(length=120), nullable=True))
+        genres = {}
+        rows = bind.execute(sa.text('SELECT {0}_id, genre FROM {0}_genre ORDER BY {0}_id, genre'.format(table)))
+        for id, genre in rows:
+            genres.setdefault(id, []).append(genre)
+        for id, values in genres.items():
+            bind.execute(
+                sa.text('UPDATE {0} SET genres = :genres WHERE id = :id'.format(table)),
+                {'genres': ','.join(values), 'id': id}
+            )
+        if not nullable:
+            op.execute("UPDATE {0} SET genres = '' WHERE genres IS NULL".format(table))
+            if bind.dialect.name != 'sqlite':
+                op.alter_column(table, 'genres', existing_type=sa.String(length=120), nullable=False)
+        op.drop_index('ix_{0}_genre_genre_{0}_id'.format(table), table_name='{0}_genre'.format(table))
+        op.drop_table('{0}_genre'.format(table))
+
+    if bind.dialect.name == 'postgresql':
+        genre_enum.drop(bind, checkfirst=True)
@@ -0,0 +1,64 @@
+"""trigram search indexes for substring matches
+
+Revision ID: 9c2e4f7a1b58
+Revises: a3f8c61d2e07
+Create Date: 2022-10-17 10:03:38.640912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e4f7a1b58'
+down_revision = 'a3f8c61d2e07'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist')
+
+# Must stay identical to SEARCH_TEXT in search.py.
+SEARCH_TEXT = "lower(name || ' ' || city || ' ' || state)"
+
+# As in 5b7d0e21c9a3.
+VECTOR = "to_tsvector('simple', name || ' ' || city || ' ' || state)"
+
+
+def _create_fts(table, options):
+    op.execute(
+        "CREATE VIRTUAL TABLE {0}_fts USING fts5(name, city, state, content='{0}', content_rowid='id'{1})".format(
+            table, options)
+    )
+    op.execute("INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')".format(table))
+
+
+def upgrade():
+    # Search matches words anywhere in the name, city or state, not only at
+    # the start of a word. PostgreSQL gets one trigram index on the searched
+    # text in place of the tsvector and name trigram indexes; on SQLite the
+    # FTS5 tables are rebuilt with the trigram tokenizer (SQLite 3.34 or
+    # later). The triggers that keep them in sync refer to them by name and
+    # are left as they are.
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute('DROP INDEX ix_{0}_name_trgm'.format(table))
+            op.execute('DROP INDEX ix_{0}_search_vector'.format(table))
+            op.execute('CREATE INDEX ix_{0}_search_trgm ON {0} USING gin ({1} gin_trgm_ops)'.format(table, SEARCH_TEXT))
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            op.execute('DROP TABLE {0}_fts'.format(table))
+            _create_fts(table, ", tokenize='trigram'")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute('DROP INDEX ix_{0}_search_trgm'.format(table))
+            op.execute('CREATE INDEX ix_{0}_search_vector ON {0} USING gin ({1})'.format(table, VECTOR))
+            op.execute('CREATE INDEX ix_{0}_name_trgm ON {0} USING gin (lower(name) gin_trgm_ops)'.format(table))
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            op.execute('DROP TABLE {0}_fts'.format(table))
+            _create_fts(table, '')
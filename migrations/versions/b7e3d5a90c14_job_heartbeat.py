@@ -0,0 +1,29 @@
+"""job heartbeat
+
+Revision ID: b7e3d5a90c14
+Revises: d4b8e2f61a93
+Create Date: 2022-10-19 15:03:27.114902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3d5a90c14'
+down_revision = 'd4b8e2f61a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Refreshed by the worker running the job; jobs whose heartbeat is
+    # older than JOB_TIMEOUT are requeued. Running jobs left over from
+    # before this revision start from their start time.
+    op.add_column('job', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE job SET heartbeat_at = started_at WHERE state = 'running'")
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,26 @@
+"""start_time index on show_archive
+
+Revision ID: d4b8e2f61a93
+Revises: 9c2e4f7a1b58
+Create Date: 2022-10-19 09:12:40.518233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e2f61a93'
+down_revision = '9c2e4f7a1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /shows and /api/shows read show_archive next to show in start_time
+    # order. On PostgreSQL the index is created on every partition.
+    op.create_index('ix_show_archive_start_time', 'show_archive', ['start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_archive_start_time', table_name='show_archive')
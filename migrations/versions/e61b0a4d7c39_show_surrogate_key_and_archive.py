@@ -0,0 +1,160 @@
+"""surrogate show id, start_time partitions and the show archive
+
+Revision ID: e61b0a4d7c39
+Revises: c2d94f3b8a61
+Create Date: 2022-09-30 14:06:41.218375
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b0a4d7c39'
+down_revision = 'c2d94f3b8a61'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_{0}_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_{0}_artist_id_start_time', ['artist_id', 'start_time']),
+)
+
+# Months of partitions created past the current one (archive.py keeps
+# creating them from there).
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _show_columns(is_past_default):
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('is_past', sa.Boolean(), server_default=is_past_default, nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    ]
+
+
+def _create_indexes(table):
+    for name, columns in INDEXES:
+        op.create_index(name.format(table), table, columns, unique=False)
+    if table == 'show':
+        op.create_index('ix_show_start_time', 'show', ['start_time'], unique=False)
+
+
+def _drop_indexes(table):
+    if table == 'show':
+        op.drop_index('ix_show_start_time', table_name='show')
+    for name, columns in INDEXES:
+        op.drop_index(name.format(table), table_name=table)
+
+
+def _upgrade_postgresql(bind):
+    # show becomes a table range-partitioned by start_time: one partition
+    # per month (show_pYYYY_MM) from the oldest show to MONTHS_AHEAD past
+    # this month, and a default partition for anything outside them. The
+    # primary key of a partitioned table must contain the partition key.
+    _drop_indexes('show')
+    op.rename_table('show', 'show_old')
+    op.execute('CREATE SEQUENCE show_id_seq')
+    for table, is_past_default in (('show', 'false'), ('show_archive', 'true')):
+        op.execute(
+            'CREATE TABLE {0} ('
+            'id integer NOT NULL, '
+            'start_time timestamp without time zone NOT NULL, '
+            'artist_id integer NOT NULL REFERENCES artist (id), '
+            'venue_id integer NOT NULL REFERENCES venue (id), '
+            'is_past boolean NOT NULL DEFAULT {1}, '
+            'PRIMARY KEY (id, start_time)'
+            ') PARTITION BY RANGE (start_time)'.format(table, is_past_default)
+        )
+        op.execute('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(table))
+    op.execute("ALTER TABLE show ALTER COLUMN id SET DEFAULT nextval('show_id_seq')")
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY show.id')
+
+    this_month = datetime.now().date().replace(day=1)
+    oldest = bind.execute(sa.text('SELECT min(start_time) FROM show_old')).scalar()
+    month = min(oldest.date().replace(day=1), this_month) if oldest else this_month
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        end = _add_months(month, 1)
+        op.execute(
+            "CREATE TABLE show_p{0:%Y_%m} PARTITION OF show FOR VALUES FROM ('{0}') TO ('{1}')".format(month, end)
+        )
+        month = end
+
+    op.execute(
+        'INSERT INTO show (start_time, artist_id, venue_id, is_past) '
+        'SELECT start_time, artist_id, venue_id, is_past FROM show_old ORDER BY start_time, artist_id, venue_id'
+    )
+    op.drop_table('show_old')
+    _create_indexes('show')
+    _create_indexes('show_archive')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        _upgrade_postgresql(bind)
+        return
+
+    # Elsewhere show is rebuilt with the surrogate key (SQLite cannot add a
+    # primary key in place) and old shows go to a plain show_archive table.
+    # Without AUTOINCREMENT SQLite would reuse the id of an archived show.
+    op.create_table('show_new', *_show_columns(sa.false()), sa.PrimaryKeyConstraint('id'), sqlite_autoincrement=True)
+    op.execute(
+        'INSERT INTO show_new (start_time, artist_id, venue_id, is_past) '
+        'SELECT start_time, artist_id, venue_id, is_past FROM show ORDER BY start_time, artist_id, venue_id'
+    )
+    _drop_indexes('show')
+    op.drop_table('show')
+    op.rename_table('show_new', 'show')
+    _create_indexes('show')
+
+    op.create_table('show_archive', *_show_columns(sa.true()), sa.PrimaryKeyConstraint('id'))
+    _create_indexes('show_archive')
+
+
+def downgrade():
+    # Back to one show per (artist, venue): the most recently booked one
+    # is kept, archived shows included, and the counters are rebuilt.
+    bind = op.get_bind()
+    op.create_table('show_old',
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('is_past', sa.Boolean(), server_default=sa.false(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'venue_id')
+    )
+    shows = '(SELECT * FROM show UNION ALL SELECT * FROM show_archive)'
+    op.execute(
+        'INSERT INTO show_old (start_time, artist_id, venue_id, is_past) '
+        'SELECT start_time, artist_id, venue_id, is_past FROM {0} shows '
+        'WHERE id IN (SELECT max(id) FROM {0} ids GROUP BY artist_id, venue_id)'.format(shows)
+    )
+    _drop_indexes('show_archive')
+    _drop_indexes('show')
+    # On PostgreSQL this drops the partitions and the id sequence with them.
+    op.drop_table('show_archive')
+    op.drop_table('show')
+    op.rename_table('show_old', 'show')
+    _create_indexes('show')
+
+    now = datetime.now()
+    bind.execute(sa.text('UPDATE show SET is_past = (start_time <= :now)'), {'now': now})
+    for table in ('venue', 'artist'):
+        op.execute(
+            'UPDATE {0} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM show WHERE show.{0}_id = {0}.id AND NOT show.is_past), '
+            'past_shows_count = (SELECT count(*) FROM show WHERE show.{0}_id = {0}.id AND show.is_past)'.format(table)
+        )
@@ -1,12 +1,59 @@
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.associationproxy import association_proxy
 
-db = SQLAlchemy()
+from forms import Genre
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+
+# Genres are stored one row per (entity, genre) in venue_genre/artist_genre.
+# In memory a set of genres can also be packed into an int, one bit per
+# Genre member, so matching is a single AND.
+GENRE_VALUES = [genre.value for genre in Genre]
+GENRE_BITS = {value: 1 << bit for bit, value in enumerate(GENRE_VALUES)}
+
+def genres_to_mask(genres):
+  mask = 0
+  for genre in genres:
+    mask |= GENRE_BITS[genre]
+  return mask
+
+def mask_to_genres(mask):
+  return [value for value in GENRE_VALUES if mask & GENRE_BITS[value]]
+
+genre_type = db.Enum(*GENRE_VALUES, name='genre')
 
 class Show(db.Model):
-  # id = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
+  # On PostgreSQL the migrations range-partition this table by start_time,
+  # where the primary key has to be (id, start_time); id stays unique
+  # through its sequence.
+  id = db.Column(db.Integer, primary_key=True)
   start_time = db.Column(db.DateTime, nullable=False)
-  artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), primary_key=True)
-  venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), primary_key=True)
+  artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+  # Set once the show has been counted in the past_shows_count counters.
+  is_past = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+  __table_args__ = (
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_start_time', 'start_time'),
+    # Ids must not be reused once the newest show has been archived.
+    {'sqlite_autoincrement': True},
+  )
+
+class ShowArchive(db.Model):
+  # Shows older than SHOW_ARCHIVE_DAYS, moved here by archive.archive_shows
+  # so the show table only holds recent and upcoming shows.
+  __tablename__ = 'show_archive'
+  id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  start_time = db.Column(db.DateTime, nullable=False)
+  artist_id = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+  is_past = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+  __table_args__ = (
+    db.Index('ix_show_archive_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_archive_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_archive_start_time', 'start_time'),
+  )
 
 class Venue(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,11 +64,21 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
     website = db.Column(db.String)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     shows = db.relationship('Show', backref='venue')
+    genre_rows = db.relationship('VenueGenre', cascade='all, delete-orphan')
+    genres = association_proxy('genre_rows', 'genre', creator=lambda genre: VenueGenre(genre=genre))
+    __table_args__ = (db.Index('ix_venue_city_state_name', 'city', 'state', 'name'),)
+
+class VenueGenre(db.Model):
+    __tablename__ = 'venue_genre'
+    venue_id = db.Column(db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(genre_type, primary_key=True)
+    __table_args__ = (db.Index('ix_venue_genre_genre_venue_id', 'genre', 'venue_id'),)
 
 class Artist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,11 +86,44 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120), nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String)
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     shows = db.relationship('Show', backref='artist')
-  
\ No newline at end of file
+    genre_rows = db.relationship('ArtistGenre', cascade='all, delete-orphan')
+    genres = association_proxy('genre_rows', 'genre', creator=lambda genre: ArtistGenre(genre=genre))
+    __table_args__ = (
+        db.Index('ix_artist_city_state', 'city', 'state'),
+        db.Index('ix_artist_name', 'name'),
+    )
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'artist_genre'
+    artist_id = db.Column(db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(genre_type, primary_key=True)
+    __table_args__ = (db.Index('ix_artist_genre_genre_artist_id', 'genre', 'artist_id'),)
+  
+class Job(db.Model):
+  # Background work run by `flask worker`; see jobs.py. `key` is unique,
+  # for jobs that must be enqueued at most once (scheduled ones), and the
+  # worker running a job keeps `heartbeat_at` current.
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String(100), nullable=False)
+  args = db.Column(db.JSON, nullable=False, default=dict)
+  key = db.Column(db.String(200), unique=True)
+  state = db.Column(db.String(20), nullable=False, default='queued', server_default='queued')
+  attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  max_attempts = db.Column(db.Integer, nullable=False)
+  run_at = db.Column(db.DateTime, nullable=False)
+  created_at = db.Column(db.DateTime, nullable=False)
+  started_at = db.Column(db.DateTime)
+  finished_at = db.Column(db.DateTime)
+  locked_by = db.Column(db.String(200))
+  heartbeat_at = db.Column(db.DateTime)
+  result = db.Column(db.JSON)
+  error = db.Column(db.Text)
+  __table_args__ = (db.Index('ix_job_state_run_at', 'state', 'run_at'),)
@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import abort, current_app, request
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+# Pages are addressed by the sort key of the row just outside them
+# (?after=<cursor> / ?before=<cursor>) instead of an OFFSET, so every page is
+# a single index range scan no matter how deep the user has paged.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def _decode_value(value, column):
+    # A cursor comes from the client, so each value must have its column's
+    # type: anything else would fail in the query instead of here.
+    if isinstance(column.type, db.DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(value, bool) or not isinstance(value, column.type.python_type):
+        raise ValueError(value)
+    return value
+
+
+def decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [_decode_value(value, column) for value, column in zip(values, columns)]
+    except (TypeError, ValueError):
+        abort(400)
+
+
+def get_page_size():
+    default = current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+
+def paginate(query, columns, key, per_page=None):
+    # `columns` is the ascending sort key, which must be unique per row;
+    # `key(row)` returns the same values for a loaded row.
+    if per_page is None:
+        per_page = get_page_size()
+    after = request.args.get('after')
+    before = request.args.get('before')
+    sort_key = db.tuple_(*columns)
+
+    if before:
+        rows = query.filter(sort_key < db.tuple_(*decode_cursor(before, columns))) \
+            .order_by(*[column.desc() for column in columns]) \
+            .limit(per_page + 1) \
+            .all()
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after:
+            query = query.filter(sort_key > db.tuple_(*decode_cursor(after, columns)))
+        rows = query.order_by(*columns).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = bool(after)
+
+    if not rows:
+        return Page(rows)
+    return Page(
+        rows,
+        next_cursor=encode_cursor(key(rows[-1])) if has_next else None,
+        prev_cursor=encode_cursor(key(rows[0])) if has_prev else None
+    )
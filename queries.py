@@ -0,0 +1,161 @@
+from datetime import datetime
+from itertools import groupby
+
+from flask import abort, g, request
+
+from models import db, Venue, Artist, Show, ShowArchive, VenueGenre, ArtistGenre, GENRE_VALUES
+from pagination import paginate
+
+#----------------------------------------------------------------------------#
+# Listing queries.
+#----------------------------------------------------------------------------#
+
+def request_now():
+    # One timestamp per request, so every past/upcoming split in it agrees.
+    if '_now' not in g:
+        g._now = datetime.now()
+    return g._now
+
+def genre_list(model, genre_id, genre):
+    # Comma-joined genres per row as a correlated subquery, split again with
+    # split_genres, so genres come with the row instead of a query per row.
+    value = db.cast(genre, db.String)
+    if db.engine.dialect.name == 'postgresql':
+        aggregate = db.func.string_agg(value, ',')
+    else:
+        aggregate = db.func.group_concat(value, ',')
+    return db.session.query(aggregate).filter(genre_id == model.id).scalar_subquery().label('genres')
+
+def split_genres(value):
+    return value.split(',') if value else []
+
+def get_genre_args():
+    # Genres to filter by, from repeated ?genre= query or form values.
+    genres = [genre for genre in request.values.getlist('genre') if genre]
+    for genre in genres:
+        if genre not in GENRE_VALUES:
+            abort(400)
+    return genres
+
+def filter_genres(query, model, genres):
+    # Every genre becomes an EXISTS over the (genre, entity id) index.
+    for genre in genres:
+        query = query.filter(model.genre_rows.any(genre=genre))
+    return query
+
+def get_venue_areas(genres=()):
+    # Builds one page of the /venues `areas` structure from a single query:
+    # one row per venue with its denormalized upcoming show count, keyset
+    # paginated in area order so the rows can be folded into areas in one pass.
+    page = paginate(
+        filter_genres(db.session.query(
+            Venue.city,
+            Venue.state,
+            Venue.id,
+            Venue.name,
+            Venue.upcoming_shows_count
+        ), Venue, genres),
+        [Venue.city, Venue.state, Venue.name, Venue.id],
+        key=lambda row: (row.city, row.state, row.name, row.id)
+    )
+
+    areas = []
+    for (city, state), venues in groupby(page.items, key=lambda row: (row.city, row.state)):
+        areas.append({
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.upcoming_shows_count
+            } for venue in venues]
+        })
+    return areas, page
+
+
+#----------------------------------------------------------------------------#
+# Detail queries.
+#----------------------------------------------------------------------------#
+
+def shows_between(start=None, end=None):
+    # id, artist_id, venue_id and start_time of the shows starting in
+    # [start, end), either bound optional, archived shows included: a
+    # UNION ALL of the two show tables, each read through its start_time
+    # index.
+    selects = []
+    for model in (Show, ShowArchive):
+        select = db.select(model.id, model.artist_id, model.venue_id, model.start_time)
+        if start is not None:
+            select = select.where(model.start_time >= start)
+        if end is not None:
+            select = select.where(model.start_time < end)
+        selects.append(select)
+    return db.union_all(*selects)
+
+def shows_of(key, id, *columns):
+    # `columns` of the shows of one venue or artist (`key` is 'venue_id' or
+    # 'artist_id'), archived shows included: a UNION ALL of the two show
+    # tables, each read through its (key, start_time) index.
+    return db.union_all(*[
+        db.select(*[getattr(model, column) for column in columns]).where(getattr(model, key) == id)
+        for model in (Show, ShowArchive)
+    ])
+
+# kind: (model, genre id and value columns, show foreign key, counterpart
+# model, counterpart foreign key, entity columns shown on the page)
+DETAILS = {
+    'venue': (Venue, VenueGenre.venue_id, VenueGenre.genre, 'venue_id', Artist, 'artist_id',
+              ('id', 'name', 'address', 'city', 'state', 'phone', 'website', 'facebook_link',
+               'seeking_talent', 'seeking_description', 'image_link')),
+    'artist': (Artist, ArtistGenre.artist_id, ArtistGenre.genre, 'artist_id', Venue, 'venue_id',
+               ('id', 'name', 'city', 'state', 'phone', 'website', 'facebook_link',
+                'seeking_venue', 'seeking_description', 'image_link')),
+}
+
+def load_detail(kind, id, now=None):
+    # The venue/artist page data in one query: the entity with its genres,
+    # outer-joined to its shows, archived ones included, and each show's
+    # artist/venue name and image. Rows are split into past and upcoming
+    # shows in one pass against a single timestamp, and the counts come
+    # from that split. Returns None when there is no such entity.
+    model, genre_id, genre, show_key, counterpart, counterpart_key, fields = DETAILS[kind]
+    other = 'artist' if kind == 'venue' else 'venue'
+    if now is None:
+        now = request_now()
+    shows = shows_of(show_key, id, show_key, counterpart_key, 'start_time').subquery('shows')
+    rows = db.session.query(
+        *[getattr(model, field) for field in fields],
+        genre_list(model, genre_id, genre),
+        shows.c.start_time,
+        (shows.c.start_time <= now).label('is_past'),
+        counterpart.id.label('counterpart_id'),
+        counterpart.name.label('counterpart_name'),
+        counterpart.image_link.label('counterpart_image_link')
+    ).select_from(model) \
+        .outerjoin(shows, shows.c[show_key] == model.id) \
+        .outerjoin(counterpart, counterpart.id == shows.c[counterpart_key]) \
+        .filter(model.id == id) \
+        .order_by(shows.c.start_time) \
+        .all()
+    if not rows:
+        return None
+
+    data = {field: getattr(rows[0], field) for field in fields}
+    data['genres'] = split_genres(rows[0].genres)
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        if row.start_time is None:
+            continue
+        show = {
+            other + '_id': row.counterpart_id,
+            'start_time': row.start_time,
+            other + '_image_link': row.counterpart_image_link,
+            other + '_name': row.counterpart_name
+        }
+        (past_shows if row.is_past else upcoming_shows).append(show)
+    data['past_shows'] = past_shows
+    data['upcoming_shows'] = upcoming_shows
+    data['past_shows_count'] = len(past_shows)
+    data['upcoming_shows_count'] = len(upcoming_shows)
+    return data
@@ -0,0 +1,282 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+from sqlalchemy import event
+
+from models import Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Recently added venues and artists.
+#----------------------------------------------------------------------------#
+# Keeps the newest RECENT_SIZE venue and artist names per process for the
+# home page, so it renders without a database query. The buffers are loaded
+# on first use and kept current by session hooks: after every commit the
+# venues and artists that were created, edited or deleted are applied to
+# this process's buffers and published on a bus, a small SQLite file
+# (RECENT_BUS_PATH, by default one per database in the temp directory)
+# shared by the workers on the host. Before serving, a worker reads the
+# events it has not seen when the file changed, or at least every
+# RECENT_BUS_INTERVAL seconds.
+#
+# Creates and renames are applied in place. A delete, or a bulk
+# Query.delete() whose rows are unknown, reloads that kind's buffer from
+# the database.
+#
+# Other per-process state follows the same bus through a BusReader: the
+# typeahead and memory search indexes, and the page cache, which publishes
+# its invalidations on it as 'invalidate' events.
+
+MODELS = {Venue: 'venue', Artist: 'artist'}
+
+# How long published events are kept; a worker idle for longer reloads.
+BUS_RETENTION = 3600
+
+
+class RecentBus:
+
+    def __init__(self, path):
+        self.path = path
+        with self.connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS recent_event ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, '
+                'action TEXT NOT NULL, kind TEXT NOT NULL, entity_id INTEGER, name TEXT)'
+            )
+
+    def connect(self):
+        # A connection per call: workers are processes and threads alike.
+        return sqlite3.connect(self.path, timeout=5)
+
+    def publish(self, events):
+        # Returns the ids given to the events.
+        now = time.time()
+        with self.connect() as connection:
+            ids = [connection.execute(
+                'INSERT INTO recent_event (created, action, kind, entity_id, name) VALUES (?, ?, ?, ?, ?)',
+                (now,) + tuple(item)
+            ).lastrowid for item in events]
+            connection.execute('DELETE FROM recent_event WHERE created < ?', (now - BUS_RETENTION,))
+        return ids
+
+    def read(self, after_id):
+        with self.connect() as connection:
+            return connection.execute(
+                'SELECT id, action, kind, entity_id, name FROM recent_event WHERE id > ? ORDER BY id', (after_id,)
+            ).fetchall()
+
+    def last_id(self):
+        with self.connect() as connection:
+            return connection.execute('SELECT coalesce(max(id), 0) FROM recent_event').fetchone()[0]
+
+    def changed(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+class BusReader:
+    # Follows the bus for one consumer in this process. read() returns the
+    # events published since the last call, [] when the file has not
+    # changed and RECENT_BUS_INTERVAL has not passed, or None when the
+    # consumer has to start over from the database: on first use, or when
+    # idle long enough that events may have been pruned.
+
+    def __init__(self, recent):
+        self.recent = recent
+        self.seen = 0
+        self.bus_state = None
+        self.polled = None
+
+    def read(self):
+        bus = self.recent.get_bus()
+        now = time.monotonic()
+        if self.polled is None or now - self.polled > BUS_RETENTION / 2:
+            self.seen = bus.last_id()
+            self.polled = now
+            return None
+        state = bus.changed()
+        if state == self.bus_state and now - self.polled < current_app.config['RECENT_BUS_INTERVAL']:
+            return []
+        self.bus_state = state
+        self.polled = now
+        events = bus.read(self.seen)
+        if events:
+            self.seen = events[-1][0]
+        return events
+
+
+class RecentBuffers:
+    # One app's buffers and bus, kept in app.extensions['recent'].
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.lock = threading.RLock()
+        self.buffers = None
+        self.stale = set()
+        self.bus = None
+        self.seen = 0
+        self.own = set()
+        self.bus_state = None
+        self.polled = 0
+
+    def get_bus(self):
+        if self.bus is None:
+            path = self.app.config['RECENT_BUS_PATH']
+            if path is None:
+                # One bus per database, so apps sharing a host don't mix.
+                database = hashlib.sha1(self.app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+                path = os.path.join(tempfile.gettempdir(), 'fyyur-recent-{0}.db'.format(database))
+            self.bus = RecentBus(path)
+        return self.bus
+
+    def publish(self, changes):
+        # Applies changes here and announces them to the other workers.
+        with self.lock:
+            ids = self.get_bus().publish(changes)
+            if self.buffers is not None:
+                self.own.update(ids)
+                for change in changes:
+                    self._apply(*change)
+        return ids
+
+    def load(self, kind):
+        model = next(model for model, name in MODELS.items() if name == kind)
+        rows = self.db.session.query(model.id, model.name) \
+            .order_by(model.id.desc()) \
+            .limit(self.app.config['RECENT_SIZE']) \
+            .all()
+        self.buffers[kind] = deque(((row.id, row.name) for row in rows), maxlen=self.app.config['RECENT_SIZE'])
+
+    def _apply(self, action, kind, id, name):
+        # Reloads are left to sync(): this may run inside a commit hook,
+        # where the session cannot query.
+        if action in ('delete', 'reload'):
+            self.stale.add(kind)
+            return
+        if action != 'upsert':
+            return
+        buffer = self.buffers[kind]
+        ids = [entry[0] for entry in buffer]
+        if id in ids:
+            buffer[ids.index(id)] = (id, name)
+            return
+        # Newest first; an id older than a full buffer's oldest is not shown.
+        position = next((i for i, other in enumerate(ids) if other < id), len(ids))
+        if position == len(ids) and len(buffer) == buffer.maxlen:
+            return
+        if len(buffer) == buffer.maxlen:
+            buffer.pop()
+        buffer.insert(position, (id, name))
+
+    def sync(self):
+        with self.lock:
+            bus = self.get_bus()
+            now = time.monotonic()
+            if self.buffers is None or now - self.polled > BUS_RETENTION / 2:
+                # First use, or idle long enough that events may be pruned.
+                self.seen = bus.last_id()
+                self.own.clear()
+                self.buffers = {kind: deque() for kind in MODELS.values()}
+                self.stale = set(MODELS.values())
+                self.polled = now
+            else:
+                state = bus.changed()
+                if state != self.bus_state or now - self.polled >= self.app.config['RECENT_BUS_INTERVAL']:
+                    self.bus_state = state
+                    self.polled = now
+                    for id, action, kind, entity_id, name in bus.read(self.seen):
+                        self.seen = id
+                        if id in self.own:
+                            self.own.discard(id)
+                        else:
+                            self._apply(action, kind, entity_id, name)
+            for kind in self.stale:
+                self.load(kind)
+            self.stale.clear()
+
+    def clear(self):
+        # Drops this process's buffers; the next use reloads them.
+        with self.lock:
+            self.buffers = None
+            self.bus = None
+
+    def latest(self, kind):
+        with self.lock:
+            self.sync()
+            return [name for id, name in self.buffers[kind]]
+
+
+class RecentlyAdded:
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('RECENT_SIZE', 10)
+        app.config.setdefault('RECENT_BUS_PATH', None)
+        app.config.setdefault('RECENT_BUS_INTERVAL', 1.0)
+        app.extensions['recent'] = RecentBuffers(app, db)
+        # The scoped session is shared by every app using `db`; the hooks
+        # find the app's buffers through the session's app.
+        for name, hook in (('after_flush', _after_flush), ('do_orm_execute', _do_orm_execute),
+                           ('after_commit', _after_commit), ('after_rollback', _after_rollback)):
+            if not event.contains(db.session, name, hook):
+                event.listen(db.session, name, hook)
+
+    def buffers(self, app=None):
+        return (app or current_app).extensions['recent']
+
+    def get_bus(self):
+        return self.buffers().get_bus()
+
+    def publish(self, changes):
+        return self.buffers().publish(changes)
+
+    def clear(self):
+        self.buffers().clear()
+
+    def latest(self, kind):
+        # Names of the newest venues or artists, newest first.
+        return self.buffers().latest(kind)
+
+
+# Session hooks; changes wait in session.info until the commit.
+
+def _after_flush(session, flush_context):
+    changes = session.info.setdefault('recent_changes', [])
+    for instance in list(session.new) + list(session.dirty):
+        kind = MODELS.get(type(instance))
+        if kind is not None:
+            changes.append(('upsert', kind, instance.id, instance.name))
+    for instance in session.deleted:
+        kind = MODELS.get(type(instance))
+        if kind is not None:
+            changes.append(('delete', kind, instance.id, None))
+
+
+def _do_orm_execute(state):
+    if state.is_delete and state.bind_mapper is not None:
+        kind = MODELS.get(state.bind_mapper.class_)
+        if kind is not None:
+            state.session.info.setdefault('recent_changes', []).append(('reload', kind, None, None))
+
+
+def _after_commit(session):
+    changes = session.info.pop('recent_changes', None)
+    buffers = session.app.extensions.get('recent')
+    if changes and buffers is not None:
+        buffers.publish(changes)
+
+
+def _after_rollback(session):
+    session.info.pop('recent_changes', None)
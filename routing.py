@@ -0,0 +1,82 @@
+import random
+import time
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.sql.dml import UpdateBase
+
+#----------------------------------------------------------------------------#
+# Read/write routing.
+#----------------------------------------------------------------------------#
+# SQLALCHEMY_BINDS entries named replica_* are read replicas of the primary
+# database (config.py fills them from DATABASE_REPLICA_URLS). Views marked
+# with @db.read_only run their queries on one replica, picked per request;
+# everything else uses the primary.
+#
+# A read-only request falls back to the primary once its session flushes
+# or runs an INSERT/UPDATE/DELETE, and a client that wrote recently reads
+# from the primary for DB_READ_AFTER_WRITE_SECONDS (tracked in the signed
+# session cookie), so a redirect after a POST sees the new rows even if
+# the replicas lag behind.
+
+REPLICA_PREFIX = 'replica_'
+
+
+def replica_binds(app):
+    return sorted(bind for bind in app.config.get('SQLALCHEMY_BINDS') or {} if bind.startswith(REPLICA_PREFIX))
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        SignallingSession.__init__(self, db, **options)
+        self.db = db
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+        elif not self.wrote:
+            replica = g.get('_db_replica') if has_app_context() else None
+            if replica is not None:
+                return self.db.get_engine(self.app, bind=replica)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+def _remember_write(db_session):
+    if db_session.wrote and has_app_context():
+        g._db_wrote = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        app.config.setdefault('DB_READ_AFTER_WRITE_SECONDS', 5)
+        SQLAlchemy.init_app(self, app)
+        # on the scoped session, as recent.py does: sessionmaker subclasses
+        # RoutingSession, so a listener on the class itself never fires
+        if not event.contains(self.session, 'after_commit', _remember_write):
+            event.listen(self.session, 'after_commit', _remember_write)
+
+        @app.before_request
+        def route_to_replica():
+            view = app.view_functions.get(request.endpoint)
+            replicas = replica_binds(app)
+            if getattr(view, 'read_only', False) and replicas and \
+                    session.get('db_primary_until', 0) < time.time():
+                g._db_replica = random.choice(replicas)
+
+        @app.after_request
+        def stick_to_primary(response):
+            if g.pop('_db_wrote', False):
+                session['db_primary_until'] = time.time() + current_app.config['DB_READ_AFTER_WRITE_SECONDS']
+            return response
+
+    def read_only(self, view):
+        # Marks a view whose queries may run on a read replica.
+        view.read_only = True
+        return view
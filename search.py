@@ -0,0 +1,408 @@
+import heapq
+import re
+import threading
+
+from flask import current_app
+
+from models import db, Venue, Artist, VenueGenre, ArtistGenre, genres_to_mask
+from recent import BusReader
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+# Venues and artists are searched on name, city and state. A search term is
+# split into words, and every word has to appear, in any case, somewhere in
+# one of the fields: "mus hop" finds "The Musical Hop", and "a" finds every
+# entity with an a in its name, city or state. Every backend applies this
+# rule; they only rank the matches differently. Results can be narrowed to
+# entities having all of the given genres. Backends return entity ids, best
+# match first.
+#
+# SEARCH_BACKEND picks the backend: 'postgres', 'sqlite', 'memory', 'like',
+# or 'auto' (the default) to pick one from the database dialect.
+
+MODELS = {
+    'venue': Venue,
+    'artist': Artist,
+}
+
+GENRE_MODELS = {
+    'venue': (VenueGenre, VenueGenre.venue_id),
+    'artist': (ArtistGenre, ArtistGenre.artist_id),
+}
+
+DEFAULT_LIMIT = 50
+
+# The text a word is looked for in; the PostgreSQL trigram index and the
+# search migrations use the same expression.
+SEARCH_TEXT = "lower(name || ' ' || city || ' ' || state)"
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def like_pattern(word):
+    # '%word%' for LIKE ... ESCAPE '\'; words are \w+, so only _ needs escaping.
+    return '%' + word.replace('_', '\\_') + '%'
+
+
+def word_clauses(tokens, params):
+    # SQL fragments requiring every token to appear in SEARCH_TEXT.
+    clauses = []
+    for i, token in enumerate(tokens):
+        clauses.append(" AND {0} LIKE :word_{1} ESCAPE '\\'".format(SEARCH_TEXT, i))
+        params['word_' + str(i)] = like_pattern(token)
+    return ''.join(clauses)
+
+
+def genre_clauses(kind, column, genres, params):
+    # SQL fragments restricting `column` to ids having every genre in `genres`.
+    clauses = []
+    for i, genre in enumerate(genres):
+        clauses.append(' AND {column} IN (SELECT {kind}_id FROM {kind}_genre WHERE genre = :genre_{i})'.format(
+            column=column, kind=kind, i=i))
+        params['genre_' + str(i)] = genre
+    return ''.join(clauses)
+
+
+class LikeSearch:
+    # An unindexed '%word%' scan, as the original search did. Kept as a
+    # fallback for databases without full-text support and as the benchmark
+    # baseline.
+
+    def search(self, kind, term, limit=DEFAULT_LIMIT, genres=()):
+        model = MODELS[kind]
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        text = db.func.lower(model.name + ' ' + model.city + ' ' + model.state)
+        query = db.session.query(model.id)
+        for token in tokens:
+            query = query.filter(text.like(like_pattern(token), escape='\\'))
+        for genre in genres:
+            query = query.filter(model.genre_rows.any(genre=genre))
+        rows = query.order_by(model.name, model.id).limit(limit).all()
+        return [row.id for row in rows]
+
+    def create_schema(self):
+        pass
+
+    def index(self, kind, entity):
+        pass
+
+    def remove(self, kind, id):
+        pass
+
+
+class PostgresSearch(LikeSearch):
+    # Words are found through a pg_trgm GIN index on SEARCH_TEXT, created by
+    # migration 9c2e4f7a1b58; trigrams make '%word%' an index lookup once a
+    # word has three letters. Rows whose words start with the search words
+    # rank first (ts_rank of a prefix query), then by name similarity.
+
+    VECTOR = "to_tsvector('simple', name || ' ' || city || ' ' || state)"
+
+    SCHEMA = [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm ON {table} USING gin (' + SEARCH_TEXT + ' gin_trgm_ops)',
+    ]
+
+    def search(self, kind, term, limit=DEFAULT_LIMIT, genres=()):
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        params = {
+            'query': ' & '.join(token + ':*' for token in tokens),
+            'term': term.lower().strip(),
+            'limit': limit
+        }
+        sql = db.text((
+            'SELECT id FROM {table} '
+            'WHERE true{words}{genres} '
+            "ORDER BY ts_rank({vector}, to_tsquery('simple', :query)) DESC, "
+            'similarity(lower(name), :term) DESC, name, id '
+            'LIMIT :limit'
+        ).format(table=kind, vector=self.VECTOR, words=word_clauses(tokens, params),
+                 genres=genre_clauses(kind, 'id', genres, params)))
+        rows = db.session.execute(sql, params)
+        return [row.id for row in rows]
+
+    def create_schema(self):
+        for kind in MODELS:
+            for statement in self.SCHEMA:
+                db.session.execute(db.text(statement.format(table=kind)))
+        db.session.commit()
+
+
+class SqliteSearch(LikeSearch):
+    # External-content FTS5 tables with the trigram tokenizer (SQLite 3.34
+    # or later), kept in sync with the base tables by triggers. A phrase
+    # query on a trigram table matches substrings, so words of three letters
+    # or more go into one MATCH, ranked by bm25 with name weighted over city
+    # and state; shorter words are checked with LIKE on the matched rows, or
+    # on the whole table when every word is short.
+
+    SCHEMA = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(name, city, state, content='{table}', content_rowid='id', tokenize='trigram')",
+        'CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN '
+        'INSERT INTO {table}_fts(rowid, name, city, state) VALUES (new.id, new.name, new.city, new.state); END',
+        'CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN '
+        "INSERT INTO {table}_fts({table}_fts, rowid, name, city, state) VALUES ('delete', old.id, old.name, old.city, old.state); END",
+        'CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF name, city, state ON {table} BEGIN '
+        "INSERT INTO {table}_fts({table}_fts, rowid, name, city, state) VALUES ('delete', old.id, old.name, old.city, old.state); "
+        'INSERT INTO {table}_fts(rowid, name, city, state) VALUES (new.id, new.name, new.city, new.state); END',
+        "INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+    def search(self, kind, term, limit=DEFAULT_LIMIT, genres=()):
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        indexed = [token for token in tokens if len(token) >= 3]
+        params = {'limit': limit}
+        words = word_clauses([token for token in tokens if len(token) < 3], params)
+        if indexed:
+            params['query'] = ' '.join('"' + token + '"' for token in indexed)
+            sql = (
+                'SELECT rowid AS id FROM {table}_fts WHERE {table}_fts MATCH :query{words}{genres} '
+                'ORDER BY bm25({table}_fts, 3.0, 1.0, 1.0), rowid LIMIT :limit'
+            ).format(table=kind, words=words, genres=genre_clauses(kind, 'rowid', genres, params))
+        else:
+            sql = (
+                'SELECT id FROM {table} WHERE 1{words}{genres} ORDER BY name, id LIMIT :limit'
+            ).format(table=kind, words=words, genres=genre_clauses(kind, 'id', genres, params))
+        rows = db.session.execute(db.text(sql), params)
+        return [row.id for row in rows]
+
+    def create_schema(self):
+        for kind in MODELS:
+            for statement in self.SCHEMA:
+                db.session.execute(db.text(statement.format(table=kind)))
+        db.session.commit()
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class InvertedIndex:
+    # token -> {id: weight} postings, and trigram -> tokens, so the tokens
+    # containing a word of three letters or more are those having all of
+    # its trigrams: a few set intersections however large the vocabulary.
+    # Shorter words have no trigram; they are looked for with str.find() in
+    # the vocabulary joined into one newline-separated string, a scan of
+    # the distinct tokens. Each document keeps its genres as a bitmask for
+    # cheap filtering.
+
+    FIELD_WEIGHTS = (('name', 3), ('city', 1), ('state', 1))
+
+    def __init__(self):
+        self.postings = {}
+        self.grams = {}
+        self.vocabulary = None
+        self.documents = {}
+
+    def add(self, id, name, city, state, genre_mask=0):
+        self.discard(id)
+        values = {'name': name, 'city': city, 'state': state}
+        weights = {}
+        for field, weight in self.FIELD_WEIGHTS:
+            for token in tokenize(values[field]):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                for gram in trigrams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+                self.vocabulary = None
+            self.postings[token][id] = weight
+        self.documents[id] = (name or '', list(weights), genre_mask)
+
+    def discard(self, id):
+        if id not in self.documents:
+            return
+        _, tokens, _ = self.documents.pop(id)
+        for token in tokens:
+            posting = self.postings[token]
+            posting.pop(id, None)
+            if not posting:
+                del self.postings[token]
+                for gram in trigrams(token):
+                    tokens = self.grams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.grams[gram]
+                self.vocabulary = None
+
+    def _tokens_containing(self, word):
+        if len(word) >= 3:
+            candidates = sorted((self.grams.get(gram, ()) for gram in trigrams(word)), key=len)
+            return [token for token in set(candidates[0]).intersection(*candidates[1:]) if word in token]
+        if self.vocabulary is None:
+            self.vocabulary = '\n' + '\n'.join(self.postings) + '\n'
+        vocabulary = self.vocabulary
+        tokens = []
+        position = vocabulary.find(word)
+        while position != -1:
+            start = vocabulary.rfind('\n', 0, position) + 1
+            end = vocabulary.index('\n', position)
+            tokens.append(vocabulary[start:end])
+            position = vocabulary.find(word, end)
+        return tokens
+
+    def _matches(self, word):
+        scores = {}
+        for token in self._tokens_containing(word):
+            # Whole-word matches rank above prefix matches, and those above
+            # matches inside a word.
+            boost = 3 if token == word else 2 if token.startswith(word) else 1
+            for id, weight in self.postings[token].items():
+                scores[id] = max(scores.get(id, 0), weight * boost)
+        return scores
+
+    def search(self, term, limit=DEFAULT_LIMIT, genre_mask=0):
+        scores = None
+        for word in tokenize(term):
+            matches = self._matches(word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {id: score + matches[id] for id, score in scores.items() if id in matches}
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        if genre_mask:
+            documents = self.documents
+            scores = {id: score for id, score in scores.items() if documents[id][2] & genre_mask == genre_mask}
+        return heapq.nsmallest(limit, scores, key=lambda id: (-scores[id], self.documents[id][0], id))
+
+
+class MemorySearch(LikeSearch):
+    # Per-process inverted indexes, built from the database on first use and
+    # kept current by the write paths through index()/remove(). Creates,
+    # edits and deletes made by other processes, web or `flask worker`,
+    # arrive through the recently-added bus (see recent.py); edited rows are
+    # re-read before the next search of their kind.
+
+    def __init__(self, recent=None):
+        self.indexes = {}
+        self.pending = {}
+        self.reader = BusReader(recent) if recent is not None else None
+        self.lock = threading.Lock()
+
+    def _load(self, kind, index, ids=None):
+        # Adds the rows of `kind`, or only those in `ids`, to `index`.
+        model = MODELS[kind]
+        genre_model, genre_id = GENRE_MODELS[kind]
+        genres = db.session.query(genre_id, genre_model.genre)
+        rows = db.session.query(model.id, model.name, model.city, model.state)
+        if ids is not None:
+            genres = genres.filter(genre_id.in_(ids))
+            rows = rows.filter(model.id.in_(ids))
+        masks = {}
+        for id, genre in genres:
+            masks[id] = masks.get(id, 0) | genres_to_mask([genre])
+        for row in rows:
+            index.add(row.id, row.name, row.city, row.state, masks.get(row.id, 0))
+
+    def _get_index(self, kind):
+        if kind not in self.indexes:
+            index = InvertedIndex()
+            self._load(kind, index)
+            self.indexes[kind] = index
+        pending = self.pending.pop(kind, None)
+        if pending:
+            # deleted since: gone from the index; edited: read back in
+            for id in pending:
+                self.indexes[kind].discard(id)
+            self._load(kind, self.indexes[kind], pending)
+        return self.indexes[kind]
+
+    def _sync(self):
+        if self.reader is None:
+            return
+        events = self.reader.read()
+        if events is None:
+            # First use, or idle long enough that events may be pruned.
+            self.indexes = {}
+            self.pending = {}
+            return
+        for event_id, action, kind, id, name in events:
+            if kind not in self.indexes:
+                continue
+            if action == 'upsert':
+                self.pending.setdefault(kind, set()).add(id)
+            elif action == 'delete':
+                self.indexes[kind].discard(id)
+                self.pending.get(kind, set()).discard(id)
+            elif action == 'reload':
+                del self.indexes[kind]
+                self.pending.pop(kind, None)
+
+    def search(self, kind, term, limit=DEFAULT_LIMIT, genres=()):
+        with self.lock:
+            self._sync()
+            return self._get_index(kind).search(term, limit, genres_to_mask(genres))
+
+    def index(self, kind, entity):
+        with self.lock:
+            if kind in self.indexes:
+                self.indexes[kind].add(entity.id, entity.name, entity.city, entity.state,
+                                       genres_to_mask(entity.genres))
+
+    def remove(self, kind, id):
+        with self.lock:
+            if kind in self.indexes:
+                self.indexes[kind].discard(int(id))
+
+
+BACKENDS = {
+    'like': LikeSearch,
+    'postgres': PostgresSearch,
+    'sqlite': SqliteSearch,
+    'memory': MemorySearch,
+}
+
+DIALECT_BACKENDS = {
+    'postgresql': 'postgres',
+    'sqlite': 'sqlite',
+}
+
+
+class Search:
+
+    def __init__(self, app=None, recent=None):
+        if app is not None:
+            self.init_app(app, recent)
+
+    def init_app(self, app, recent=None):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.config.setdefault('SEARCH_RESULT_LIMIT', DEFAULT_LIMIT)
+        # `recent` (recent.py) carries other processes' changes to the
+        # memory backend, which is created on first use.
+        app.extensions['search'] = {'recent': recent}
+
+    @property
+    def backend(self):
+        state = current_app.extensions['search']
+        if 'backend' not in state:
+            name = current_app.config['SEARCH_BACKEND']
+            if name == 'auto':
+                name = DIALECT_BACKENDS.get(db.engine.dialect.name, 'like')
+            state['backend'] = MemorySearch(state['recent']) if name == 'memory' else BACKENDS[name]()
+        return state['backend']
+
+    def search(self, kind, term, limit=None, genres=()):
+        if limit is None:
+            limit = current_app.config['SEARCH_RESULT_LIMIT']
+        return self.backend.search(kind, term, limit, genres)
+
+    def create_schema(self):
+        self.backend.create_schema()
+
+    def index(self, kind, entity):
+        self.backend.index(kind, entity)
+
+    def remove(self, kind, id):
+        self.backend.remove(kind, id)
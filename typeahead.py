@@ -0,0 +1,159 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from flask import current_app
+
+from models import db, Venue, Artist
+from recent import BusReader
+from search import tokenize
+
+#----------------------------------------------------------------------------#
+# Typeahead.
+#----------------------------------------------------------------------------#
+# /api/typeahead completes venue and artist names for the show form. Each
+# process keeps a prefix index per kind, built from the database on first
+# use, holding every name under each of its word starts ("the musical hop",
+# "musical hop" and "hop"), so "hop" finds The Musical Hop. A lookup finds
+# the typed prefix by bisection and reads the first TYPEAHEAD_LIMIT distinct
+# names from there, in order of the matching words, so it takes time
+# logarithmic in the number of names.
+#
+# Creates, edits and deletes reach every worker's indexes through the bus
+# the recently-added buffers publish them on (see recent.py); a bulk change,
+# such as an import, drops the index of that kind to be rebuilt on next use.
+
+MODELS = {
+    'venue': Venue,
+    'artist': Artist,
+}
+
+
+def keys_for(name):
+    words = tokenize(name)
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class PrefixIndex:
+    # A prefix trie flattened into its depth-first order: every key sorted
+    # in one list (with the entity ids alongside, ties ordered by id), so
+    # the keys under a prefix are one run found by bisection. Pointer-based
+    # trie nodes cost a few hundred bytes of Python objects per key; this
+    # costs two list slots and the key string.
+
+    def __init__(self, names=()):
+        self.names = dict(names)
+        entries = sorted((key, id) for id, name in self.names.items() for key in keys_for(name))
+        self.keys = [key for key, id in entries]
+        self.ids = [id for key, id in entries]
+
+    def __len__(self):
+        return len(self.names)
+
+    def _span(self, key):
+        return bisect_left(self.keys, key), bisect_right(self.keys, key)
+
+    def add(self, id, name):
+        name = name or ''
+        if self.names.get(id) == name:
+            return
+        self.discard(id)
+        self.names[id] = name
+        for key in keys_for(name):
+            low, high = self._span(key)
+            position = bisect_left(self.ids, id, low, high)
+            self.keys.insert(position, key)
+            self.ids.insert(position, id)
+
+    def discard(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        for key in keys_for(name):
+            low, high = self._span(key)
+            position = bisect_left(self.ids, id, low, high)
+            if position < high and self.ids[position] == id:
+                del self.keys[position]
+                del self.ids[position]
+
+    def complete(self, prefix, limit):
+        # [(id, name)] of up to `limit` names with a word starting with
+        # `prefix`, ordered by the name from that word on.
+        keys, ids = self.keys, self.ids
+        results = {}
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            id = ids[position]
+            if id not in results:
+                results[id] = self.names[id]
+                if len(results) == limit:
+                    break
+            position += 1
+        return list(results.items())
+
+
+class TypeaheadIndexes:
+    # One app's indexes, kept in app.extensions['typeahead'].
+
+    def __init__(self, recent):
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.reader = BusReader(recent)
+
+    def load(self, kind):
+        model = MODELS[kind]
+        index = PrefixIndex(db.session.query(model.id, model.name))
+        self.indexes[kind] = index
+        return index
+
+    def sync(self):
+        # Applies the changes other workers, and this one, published since
+        # the last call.
+        events = self.reader.read()
+        if events is None:
+            # Nothing built yet, or idle long enough that events may be pruned.
+            self.indexes = {}
+            return
+        for event_id, action, kind, id, name in events:
+            index = self.indexes.get(kind)
+            if index is None:
+                continue
+            if action == 'upsert':
+                index.add(id, name)
+            elif action == 'delete':
+                index.discard(id)
+            elif action == 'reload':
+                del self.indexes[kind]
+
+    def complete(self, kind, prefix, limit=None):
+        if limit is None:
+            limit = current_app.config['TYPEAHEAD_LIMIT']
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return []
+        with self.lock:
+            self.sync()
+            index = self.indexes.get(kind)
+            if index is None:
+                index = self.load(kind)
+            return index.complete(prefix, limit)
+
+    def clear(self):
+        with self.lock:
+            self.indexes = {}
+
+
+class Typeahead:
+
+    def __init__(self, app=None, recent=None):
+        if app is not None:
+            self.init_app(app, recent)
+
+    def init_app(self, app, recent):
+        app.config.setdefault('TYPEAHEAD_LIMIT', 10)
+        app.extensions['typeahead'] = TypeaheadIndexes(recent)
+
+    def complete(self, kind, prefix, limit=None):
+        return current_app.extensions['typeahead'].complete(kind, prefix, limit)
+
+    def clear(self):
+        current_app.extensions['typeahead'].clear()